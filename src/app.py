@@ -1,7 +1,9 @@
 from fastapi import FastAPI
 from fastapi.concurrency import asynccontextmanager
+from fastapi.responses import ORJSONResponse
 
 from src.infrastructure.database import init_db
+from src.infrastructure.http import http_client
 from src.modules.claim_builder.analyze import analyze_claim_builder
 from src.modules.clinical_trial.analyze import analyze_clinical_trial
 from src.modules.competitive_analysis.analyze import analyze_competitive_analysis
@@ -25,10 +27,14 @@ from src.modules.checklist.analyze import analyze_checklist
 async def lifespan(app: FastAPI):
     await init_db()
     yield
-    # Add any cleanup logic here if needed
+    await http_client.aclose()
 
 
-app = FastAPI(title="AI Service", lifespan=lifespan)
+app = FastAPI(
+    title="AI Service",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
 
 
 @app.get("/")
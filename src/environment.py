@@ -25,6 +25,9 @@ class Environment(BaseSettings):
 
     competitive_analysis_number_of_system_search_documents: int = Field(3)
 
+    index_system_data_max_concurrent: int = Field(8)
+    index_system_data_summary_batch_size: int = Field(8)
+
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
 
@@ -0,0 +1,9 @@
+import httpx
+
+
+# Shared so downloads reuse pooled connections instead of a new TCP/TLS
+# handshake per request; closed in the app lifespan.
+http_client = httpx.AsyncClient(
+    timeout=60,
+    limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+)
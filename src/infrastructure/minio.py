@@ -1,5 +1,11 @@
 import asyncio
+import os
 from datetime import timedelta
+from pathlib import Path
+from typing import AsyncIterator
+from uuid import uuid4
+import certifi
+import urllib3
 from fastapi import FastAPI
 from minio import Minio
 from minio.datatypes import Object
@@ -7,6 +13,25 @@ from src.environment import environment
 
 app = FastAPI()
 
+# Shared across every download so concurrent fetches reuse keep-alive
+# connections instead of overflowing the default 10-connection pool.
+MINIO_MAX_POOL_CONNECTIONS = 32
+
+minio_http_client = urllib3.PoolManager(
+    timeout=urllib3.Timeout(
+        connect=timedelta(minutes=5).seconds,
+        read=timedelta(minutes=5).seconds,
+    ),
+    maxsize=MINIO_MAX_POOL_CONNECTIONS,
+    cert_reqs="CERT_REQUIRED",
+    ca_certs=os.environ.get("SSL_CERT_FILE") or certifi.where(),
+    retries=urllib3.Retry(
+        total=5,
+        backoff_factor=0.2,
+        status_forcelist=[500, 502, 503, 504],
+    ),
+)
+
 minio_client = Minio(
     environment.minio_internal_endpoint.removeprefix("http://").removeprefix(
         "https://"
@@ -14,6 +39,7 @@ minio_client = Minio(
     access_key=environment.minio_root_user,
     secret_key=environment.minio_root_password,
     secure=environment.minio_internal_endpoint.startswith("https://"),
+    http_client=minio_http_client,
 )
 
 
@@ -48,4 +74,154 @@ async def get_object(object_name: str) -> bytes:
         bucket_name=environment.minio_bucket,
         object_name=object_name,
     )
-    return data.read()
+    try:
+        return data.read()
+    finally:
+        data.close()
+        data.release_conn()
+
+
+def _stream_object_to_file(object_name: str, dest_path: Path, chunk_size: int) -> None:
+    response = minio_client.get_object(
+        bucket_name=environment.minio_bucket,
+        object_name=object_name,
+    )
+    try:
+        with open(dest_path, "wb") as f:
+            for chunk in response.stream(chunk_size):
+                f.write(chunk)
+    finally:
+        response.close()
+        response.release_conn()
+
+
+async def stream_object(
+    object_name: str,
+    dest_path: Path,
+    chunk_size: int = 1 << 20,
+) -> Path:
+    """
+    Stream an object straight to `dest_path` without holding it in memory.
+    The parent folder of `dest_path` must already exist.
+    """
+    await asyncio.to_thread(_stream_object_to_file, object_name, dest_path, chunk_size)
+    return dest_path
+
+
+async def get_object_stream(
+    object_name: str,
+    chunk_size: int = 1 << 20,
+) -> AsyncIterator[bytes]:
+    """
+    Yield an object in chunks of at most `chunk_size` bytes, so callers
+    can process it without holding the whole object in memory.
+    """
+    response = await asyncio.to_thread(
+        minio_client.get_object,
+        bucket_name=environment.minio_bucket,
+        object_name=object_name,
+    )
+    try:
+        chunks = response.stream(chunk_size)
+        while chunk := await asyncio.to_thread(next, chunks, b""):
+            yield chunk
+    finally:
+        response.close()
+        response.release_conn()
+
+
+MULTIPART_THRESHOLD = 8 * 1024 * 1024
+MULTIPART_CHUNK_SIZE = 8 * 1024 * 1024
+MULTIPART_MAX_CONCURRENCY = 10
+
+
+def _download_object_range(
+    object_name: str,
+    fd: int,
+    offset: int,
+    length: int,
+) -> None:
+    response = minio_client.get_object(
+        bucket_name=environment.minio_bucket,
+        object_name=object_name,
+        offset=offset,
+        length=length,
+    )
+    try:
+        position = offset
+        for chunk in response.stream(1 << 20):
+            os.pwrite(fd, chunk, position)
+            position += len(chunk)
+    finally:
+        response.close()
+        response.release_conn()
+
+
+async def download_object(
+    object_name: str,
+    dest_path: Path,
+    size: int | None = None,
+    multipart_threshold: int = MULTIPART_THRESHOLD,
+    chunk_size: int = MULTIPART_CHUNK_SIZE,
+    max_concurrency: int = MULTIPART_MAX_CONCURRENCY,
+) -> Path:
+    """
+    Download an object to `dest_path`, splitting objects larger than
+    `multipart_threshold` into concurrent ranged GETs written to a sibling
+    temporary file, which replaces `dest_path` once every part is done.
+    Pass `size` when it is already known to skip the stat request.
+    The parent folder of `dest_path` must already exist.
+    """
+    if size is None:
+        stat = await asyncio.to_thread(
+            minio_client.stat_object,
+            bucket_name=environment.minio_bucket,
+            object_name=object_name,
+        )
+        size = stat.size
+    if size is None or size <= multipart_threshold:
+        return await stream_object(object_name, dest_path)
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+    # Write into a sibling file so an interrupted download never leaves a
+    # full-size but incomplete copy at dest_path
+    tmp_path = dest_path.with_name(f".{dest_path.name}.{uuid4().hex}.part")
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+    running: list[asyncio.Future] = []
+
+    async def download_part(offset: int) -> None:
+        async with semaphore:
+            part = asyncio.ensure_future(
+                asyncio.to_thread(
+                    _download_object_range,
+                    object_name,
+                    fd,
+                    offset,
+                    min(chunk_size, size - offset),
+                )
+            )
+            running.append(part)
+            # A cancel must not abandon a thread that is still writing to fd
+            await asyncio.shield(part)
+
+    tasks = [
+        asyncio.ensure_future(download_part(offset))
+        for offset in range(0, size, chunk_size)
+    ]
+    try:
+        try:
+            os.ftruncate(fd, size)
+            await asyncio.gather(*tasks)
+        finally:
+            # Stop the parts that have not started, then wait for every part
+            # thread before closing fd, since its number can be reused
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await asyncio.gather(*running, return_exceptions=True)
+            os.close(fd)
+        os.replace(tmp_path, dest_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return dest_path
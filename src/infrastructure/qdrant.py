@@ -1,3 +1,6 @@
+import asyncio
+import hashlib
+from collections import OrderedDict
 from typing import Optional, TypedDict
 from uuid import uuid4
 
@@ -8,6 +11,7 @@ from qdrant_client.models import (
     FieldCondition,
     Filter,
     FilterSelector,
+    MatchAny,
     MatchValue,
     PointStruct,
     ScoredPoint,
@@ -26,6 +30,12 @@ client = QdrantClient(
 
 EMBEDDING_MODEL: str = "text-embedding-3-small"
 EMBED_DIM: int = 1536
+EMBEDDING_CACHE_SIZE: int = 1024
+
+# Re-runs mostly embed the same summaries again, so keep recent vectors
+# in memory keyed by a digest of the input text. Vectors are stored as
+# tuples so a caller mutating its copy cannot corrupt the cache.
+_embedding_cache: OrderedDict[bytes, tuple[float, ...]] = OrderedDict()
 
 try:
     client.create_collection(
@@ -44,10 +54,48 @@ async def embed_text(text: str) -> list[float]:
     """
     Embed the given text into a high-dimensional vector.
     """
-    openai_client = get_openai_client()
-    resp = await openai_client.embeddings.create(input=[text], model=EMBEDDING_MODEL)
-    # resp is a CreateEmbeddingResponse object, so access via attributes:
-    return resp.data[0].embedding  # list[float]
+    vectors = await embed_texts([text])
+    return vectors[0]
+
+
+async def embed_texts(texts: list[str]) -> list[list[float]]:
+    """
+    Embed several texts with a single embeddings request.
+    Vectors are returned in the same order as `texts`.
+    """
+    if not texts:
+        return []
+    keys = [_embedding_cache_key(text) for text in texts]
+    vectors: dict[bytes, tuple[float, ...]] = {}
+    missing: dict[bytes, str] = {}
+    for key, text in zip(keys, texts):
+        cached = _embedding_cache.get(key)
+        if cached is None:
+            missing[key] = text
+        else:
+            _embedding_cache.move_to_end(key)
+            vectors[key] = cached
+
+    if missing:
+        missing_keys = list(missing)
+        openai_client = get_openai_client()
+        resp = await openai_client.embeddings.create(
+            input=list(missing.values()), model=EMBEDDING_MODEL
+        )
+        # resp.data is not guaranteed to be ordered, so map back by input index
+        for item in resp.data:
+            key = missing_keys[item.index]
+            vectors[key] = _embedding_cache[key] = tuple(item.embedding)
+        while len(_embedding_cache) > EMBEDDING_CACHE_SIZE:
+            _embedding_cache.popitem(last=False)
+
+    return [list(vectors[key]) for key in keys]
+
+
+def _embedding_cache_key(text: str) -> bytes:
+    return hashlib.blake2b(
+        f"{EMBEDDING_MODEL}\0{text}".encode(), digest_size=16
+    ).digest()
 
 
 async def add_document(filename: str, summary: FileSummary) -> None:
@@ -66,23 +114,27 @@ async def add_document(filename: str, summary: FileSummary) -> None:
         vector=vector,
         payload=payload,
     )
-    client.upsert(
+    await asyncio.to_thread(
+        client.upsert,
         collection_name="system_data",
         points=[point],
     )
 
 
-def delete_document(filename: str) -> None:
+async def delete_documents(filenames: list[str]) -> None:
     """
-    Delete a document point by filename.
+    Delete the document points of every filename in one request.
     """
+    if not filenames:
+        return
     filt = Filter(
-        must=[FieldCondition(key="filename", match=MatchValue(value=filename))]
+        must=[FieldCondition(key="filename", match=MatchAny(any=filenames))]
     )
-    client.delete(
+    await asyncio.to_thread(
+        client.delete,
         collection_name="system_data",
         points_selector=FilterSelector(filter=filt),
-        wait=True,  # optional: wait until Qdrant has acknowledged deletion
+        wait=True,
     )
 
 
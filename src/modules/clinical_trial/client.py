@@ -51,7 +51,7 @@ def _to_v2_like(sys_rec: Dict) -> Dict:
     }
 
 async def _iter_s3_records(prefix: str) -> AsyncIterator[Dict]:
-    from src.infrastructure.minio import list_objects, get_object
+    from src.infrastructure.minio import list_objects, get_object_stream
     objs = await list_objects(prefix)
     if not objs:
         logger.warning(f"[ct] No shard objects found under s3://<bucket>/{prefix}")
@@ -60,18 +60,29 @@ async def _iter_s3_records(prefix: str) -> AsyncIterator[Dict]:
             continue
         key = obj.object_name  # e.g. clinical_trial_data/shards/part-00000.jsonl
         try:
-            raw = await get_object(key)  # bytes
+            # Read the shard line by line so an early break in the caller
+            # never downloads the rest of it
+            async for line in _iter_lines(get_object_stream(key)):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except Exception as e:
+                    logger.warning(f"[ct] bad JSON in {key}: {e}")
         except Exception as e:
             logger.warning(f"[ct] failed to read {key}: {e}")
             continue
-        for line in raw.splitlines():
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                yield json.loads(line)
-            except Exception as e:
-                logger.warning(f"[ct] bad JSON in {key}: {e}")
+
+async def _iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line
+    if pending:
+        yield pending
 
 async def search_trials(condition: str, sponsor: str, page_size: int = 100) -> List[Dict]:
     """
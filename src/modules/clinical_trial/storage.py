@@ -1,5 +1,6 @@
 from typing import TypedDict
 import mimetypes
+from pathlib import Path
 from loguru import logger
 from src.infrastructure.minio import (
     generate_get_object_presigned_url,
@@ -32,9 +33,15 @@ async def analyze_clinical_trial_document(
     )
     file_name = clinical_trial_document_info["file_name"]
     url = await generate_get_object_presigned_url(obj.object_name)
-    path = await download_minio_file(obj.object_name)
-    path.rename(path.parent / file_name)
-    path = path.parent / file_name
+    # Saved under its parsed file name beside the object's /tmp folder
+    dest_path = Path(f"/tmp/{obj.object_name}").parent / file_name
+    dest_path.parent.mkdir(parents=True, exist_ok=True)
+    path = await download_minio_file(
+        obj.object_name,
+        obj.size,
+        obj.last_modified,
+        dest_path=dest_path,
+    )
     document = ClinicalTrialDocumentResponse(
         document_name=document_name,
         file_name=file_name,
@@ -1,3 +1,4 @@
+import asyncio
 from pathlib import Path
 from beanie import PydanticObjectId
 from loguru import logger
@@ -11,6 +12,7 @@ from src.modules.competitive_analysis.download_system_product_competitive_docume
 )
 from src.modules.competitive_analysis.download_user_product_competitive_documents import (
     Document,
+    canon_product_name,
     download_user_product_competitive_documents,
 )
 from src.modules.competitive_analysis.model import (
@@ -18,21 +20,115 @@ from src.modules.competitive_analysis.model import (
     CompetitiveAnalysisDetail,
 )
 from src.modules.competitive_analysis.schema import CompetitiveAnalysisSource
+from src.modules.competitive_analysis.storage import get_competitive_analysis_documents
 from src.modules.index_system_data.summarize_files import summarize_files
 from src.modules.product.model import Product
 from src.modules.product_profile.storage import get_product_profile_documents
 from src.utils.async_gather_with_max_concurrent import async_gather_with_max_concurrent
-from beanie.operators import In
+from pymongo import DeleteMany, UpdateOne
+import numpy as np
+
+
+async def get_to_simple_name_map(product_id: str) -> dict[str, str]:
+    """
+    Map each competitor product name already analysed for this product,
+    in its canon_product_name form, to the simple name it was given,
+    joined server-side in one query.
+    """
+    existing_names = await CompetitiveAnalysis.aggregate(
+        [
+            {"$match": {"product_id": product_id}},
+            {
+                "$addFields": {
+                    "_detail_oid": {"$toObjectId": "$competitive_analysis_detail_id"}
+                }
+            },
+            {
+                "$lookup": {
+                    "from": CompetitiveAnalysisDetail.Settings.name,
+                    "localField": "_detail_oid",
+                    "foreignField": "_id",
+                    "pipeline": [
+                        {"$project": {"product_name": 1, "product_simple_name": 1}}
+                    ],
+                    "as": "detail",
+                }
+            },
+            {"$unwind": "$detail"},
+            {"$match": {"detail.product_simple_name": {"$ne": "Your Product"}}},
+            {
+                "$project": {
+                    "_id": 0,
+                    "product_name": "$detail.product_name",
+                    "product_simple_name": "$detail.product_simple_name",
+                }
+            },
+        ]
+    ).to_list()
+    return {
+        canon_product_name(doc["product_name"]): doc["product_simple_name"]
+        for doc in existing_names
+    }
+
+
+async def get_detail_ids_by_simple_name(
+    product_id: str,
+    simple_names: set[str],
+) -> list[str]:
+    """
+    Detail ids of the analyses of this product whose simple name, in its
+    canon_product_name form, is one of `simple_names`.
+    """
+    rows = await CompetitiveAnalysis.aggregate(
+        [
+            {"$match": {"product_id": product_id}},
+            {
+                "$addFields": {
+                    "_detail_oid": {"$toObjectId": "$competitive_analysis_detail_id"}
+                }
+            },
+            {
+                "$lookup": {
+                    "from": CompetitiveAnalysisDetail.Settings.name,
+                    "localField": "_detail_oid",
+                    "foreignField": "_id",
+                    "pipeline": [{"$project": {"product_simple_name": 1}}],
+                    "as": "detail",
+                }
+            },
+            {"$unwind": "$detail"},
+            {
+                "$project": {
+                    "_id": 0,
+                    "competitive_analysis_detail_id": 1,
+                    "product_simple_name": "$detail.product_simple_name",
+                }
+            },
+        ]
+    ).to_list()
+    return [
+        row["competitive_analysis_detail_id"]
+        for row in rows
+        if canon_product_name(row["product_simple_name"]) in simple_names
+    ]
 
 
 async def do_analyze_competitive_analysis(product_id: str) -> None:
+    # Check the product first so a missing one never starts any downloads
     product = await Product.find_one(Product.id == PydanticObjectId(product_id))
     if not product:
         logger.warning(f"Product not found for product_id={product_id}")
         return
+    (
+        product_profile_documents,
+        to_simple_name_map,
+        competitive_analysis_documents,
+    ) = await asyncio.gather(
+        get_product_profile_documents(product_id),
+        get_to_simple_name_map(product_id),
+        get_competitive_analysis_documents(product_id),
+    )
     logger.info(f"Starting competitive analysis for product_id={product_id}")
-
-    product_profile_documents = await get_product_profile_documents(product_id)
     logger.info(
         f"Fetched {len(product_profile_documents)} product profile documents for product_id={product_id}"
     )
@@ -46,75 +142,54 @@ async def do_analyze_competitive_analysis(product_id: str) -> None:
     logger.info(f"Product profile summary for {product_id}: {product_profile_summary}")
 
     q_vector = await embed_text(product_profile_summary.summary)
+    q_np = np.ascontiguousarray(q_vector, dtype=np.float32)
+    q_np /= np.linalg.norm(q_np) + 1e-12
     logger.info(
         f"Embedded product profile summary into vector for product_id={product_id}"
     )
 
-    system_competitor_documents = await download_system_product_competitive_documents(
-        product,
-        q_vector,
-        environment.competitive_analysis_number_of_system_search_documents,
+    logger.info(f"Simple name map: {to_simple_name_map}")
+
+    system_competitor_documents, user_competitor_documents = await asyncio.gather(
+        download_system_product_competitive_documents(
+            product,
+            q_vector,
+            environment.competitive_analysis_number_of_system_search_documents,
+        ),
+        download_user_product_competitive_documents(
+            competitive_analysis_documents,
+            q_np,
+            to_simple_name_map,
+        ),
     )
     logger.info(
         f"Downloaded {len(system_competitor_documents)} system competitor documents for product_id={product_id}"
     )
-    logger.info(system_competitor_documents)
-
-    exist_competitive_analysis = await CompetitiveAnalysis.find(
-        CompetitiveAnalysis.product_id == product_id
-    ).to_list()
-    exist_competitive_analysis_ids = [
-        PydanticObjectId(analysis.competitive_analysis_detail_id)
-        for analysis in exist_competitive_analysis
-    ]
-    if exist_competitive_analysis_ids:
-        exist_competitive_analysis_details = await CompetitiveAnalysisDetail.find(
-            In(CompetitiveAnalysisDetail.id, exist_competitive_analysis_ids)
-        ).to_list()
-        logger.info(
-            f"Found {len(exist_competitive_analysis_details)} existing competitive analysis details for product_id={product_id}"
-        )
-    else:
-        exist_competitive_analysis_details = []
-
-    exist_competitive_analysis_details = [
-        i
-        for i in exist_competitive_analysis_details
-        if i.product_simple_name != "Your Product"
-    ]
-
-    to_simple_name_map = {
-        doc.product_name: doc.product_simple_name
-        for doc in exist_competitive_analysis_details
-    }
-
-    logger.info(f"Simple name map: {to_simple_name_map}")
-
-    user_competitor_documents = await download_user_product_competitive_documents(
-        product_id,
-        q_vector,
-        to_simple_name_map,
+    logger.opt(lazy=True).debug(
+        "System competitor documents: {}",
+        lambda: [doc.product_name for doc in system_competitor_documents],
     )
     logger.info(
         f"Downloaded {len(user_competitor_documents)} user competitor documents for product_id={product_id}"
     )
 
-    user_docs_map = {doc.product_name: doc for doc in user_competitor_documents}
-    to_remove_index: list[int] = []
-    for i, sys_doc in enumerate(system_competitor_documents):
-        user_doc = user_docs_map.get(sys_doc.product_name)
-        if user_doc is not None:
-            logger.info(
-                f"Merging system doc '{sys_doc.product_name}' into user competitor documents"
-            )
-            user_doc.product_competitive_documents.append(
-                Document(path=sys_doc.product_competitive_document, key=sys_doc.key)
-            )
-            to_remove_index.append(i)
-
-    for i in reversed(to_remove_index):
-        logger.info(f"Removing merged system competitor document at index {i}")
-        system_competitor_documents.pop(i)
+    user_docs_map = {
+        canon_product_name(doc.product_name): doc
+        for doc in user_competitor_documents
+    }
+    kept_system_competitor_documents = []
+    for sys_doc in system_competitor_documents:
+        user_doc = user_docs_map.get(canon_product_name(sys_doc.product_name))
+        if user_doc is None:
+            kept_system_competitor_documents.append(sys_doc)
+            continue
+        logger.info(
+            f"Merging system doc '{sys_doc.product_name}' into user competitor documents"
+        )
+        user_doc.product_competitive_documents.append(
+            Document(path=sys_doc.product_competitive_document, key=sys_doc.key)
+        )
+    system_competitor_documents = kept_system_competitor_documents
 
     logger.info(
         f"After merging, {len(system_competitor_documents)} system competitor documents and "
@@ -165,7 +240,10 @@ async def do_analyze_competitive_analysis(product_id: str) -> None:
     logger.info(
         f"Preparing {len(user_competitor_documents)} user competitor analysis tasks"
     )
-    logger.info(user_competitor_documents)
+    logger.opt(lazy=True).debug(
+        "User competitor documents: {}",
+        lambda: [doc.product_name for doc in user_competitor_documents],
+    )
     user_tasks = [
         create_competitive_analysis(
             product_simple_name=comp_docs.product_name,
@@ -186,34 +264,73 @@ async def do_analyze_competitive_analysis(product_id: str) -> None:
         for comp_docs in user_competitor_documents
     ]
     # --- RUN ALL TASKS IN PARALLEL ---
+    # The self analysis gets its own lane so it never queues behind a
+    # long list of competitor analyses.
     logger.info("Running all competitive analysis tasks in parallel")
-    competitive_analysis_details: list[
-        CompetitiveAnalysisDetail
-    ] = await async_gather_with_max_concurrent([
-        *self_tasks,
-        *system_tasks,
-        *user_tasks,
-    ])
+    self_results, competitor_results = await asyncio.gather(
+        async_gather_with_max_concurrent(
+            self_tasks,
+            task_name="SELF_COMPETITIVE_ANALYSIS",
+        ),
+        async_gather_with_max_concurrent(
+            [*system_tasks, *user_tasks],
+            task_name="COMPETITOR_COMPETITIVE_ANALYSIS",
+        ),
+    )
+    # Results come back in task order, so pair each one with the simple
+    # name its detail is saved under
+    task_simple_names = [
+        "Your Product",
+        *[comp_doc.product_name for comp_doc in system_competitor_documents],
+        *[comp_docs.product_name for comp_docs in user_competitor_documents],
+    ]
+    competitive_analysis_details: list[CompetitiveAnalysisDetail] = []
+    failed_simple_names: set[str] = set()
+    for simple_name, result in zip(
+        task_simple_names, [*self_results, *competitor_results]
+    ):
+        if isinstance(result, Exception):
+            logger.warning(
+                f"Skipping failed competitive analysis task for {simple_name}: {result}"
+            )
+            failed_simple_names.add(canon_product_name(simple_name))
+            continue
+        competitive_analysis_details.append(result)
     logger.info(
         f"Completed {len(competitive_analysis_details)} competitive analysis tasks"
     )
 
-    decided_cas = await CompetitiveAnalysis.find(
-        CompetitiveAnalysis.product_id == product_id,
-    ).to_list()
-    decided_cas = [doc for doc in decided_cas if doc.accepted is not None]
-    decided_ca_detail_ids = [doc.competitive_analysis_detail_id for doc in decided_cas]
-    decided_ca_detail_ids_map = {
-        doc.competitive_analysis_detail_id: doc for doc in decided_cas
-    }
-    decided_cads = await CompetitiveAnalysisDetail.find(
-        In(
-            CompetitiveAnalysisDetail.id,
-            [PydanticObjectId(i) for i in decided_ca_detail_ids],
-        )
+    decided_cads = await CompetitiveAnalysis.aggregate(
+        [
+            {"$match": {"product_id": product_id, "accepted": {"$ne": None}}},
+            {
+                "$addFields": {
+                    "_detail_oid": {"$toObjectId": "$competitive_analysis_detail_id"}
+                }
+            },
+            {
+                "$lookup": {
+                    "from": CompetitiveAnalysisDetail.Settings.name,
+                    "localField": "_detail_oid",
+                    "foreignField": "_id",
+                    "pipeline": [{"$project": {"product_name": 1}}],
+                    "as": "detail",
+                }
+            },
+            {"$unwind": "$detail"},
+            {
+                "$project": {
+                    "_id": 0,
+                    "product_name": "$detail.product_name",
+                    "accepted": 1,
+                    "accept_reject_reason": 1,
+                    "accept_reject_by": 1,
+                }
+            },
+        ]
     ).to_list()
     decided_cads_map = {
-        doc.product_name: decided_ca_detail_ids_map[str(doc.id)] for doc in decided_cads
+        canon_product_name(doc["product_name"]): doc for doc in decided_cads
     }
 
     competitive_analysis_list: list[CompetitiveAnalysis] = []
@@ -223,23 +340,62 @@ async def do_analyze_competitive_analysis(product_id: str) -> None:
             competitive_analysis_detail_id=str(doc.id),
             is_self_analysis=doc.data_type == "self_analysis",
         )
-        if doc.product_name in decided_cads_map:
-            ca.accepted = decided_cads_map[doc.product_name].accepted
-            ca.accept_reject_reason = decided_cads_map[
-                doc.product_name
-            ].accept_reject_reason
-            ca.accept_reject_by = decided_cads_map[doc.product_name].accept_reject_by
+        decided = decided_cads_map.get(canon_product_name(doc.product_name))
+        if decided is not None:
+            ca.accepted = decided.get("accepted")
+            ca.accept_reject_reason = decided.get("accept_reject_reason")
+            ca.accept_reject_by = decided.get("accept_reject_by")
         competitive_analysis_list.append(ca)
 
+    if not competitive_analysis_list:
+        # Every task failed: keep the existing records and let the caller
+        # mark the run as errored instead of reporting it as complete
+        logger.error(
+            f"All {len(failed_simple_names)} competitive analysis tasks failed "
+            f"for product_id={product_id}, keeping existing records"
+        )
+        raise RuntimeError(f"Competitive analysis failed for product_id={product_id}")
+
+    keep_detail_ids = [
+        ca.competitive_analysis_detail_id for ca in competitive_analysis_list
+    ]
+    operations: list[UpdateOne | DeleteMany] = [
+        UpdateOne(
+            {
+                "product_id": product_id,
+                "competitive_analysis_detail_id": ca.competitive_analysis_detail_id,
+            },
+            {"$set": ca.model_dump(exclude={"id", "revision_id"})},
+            upsert=True,
+        )
+        for ca in competitive_analysis_list
+    ]
+    if failed_simple_names:
+        # The accept/reject decision of a competitor lives only on its
+        # existing record, so keep the previous records of failed tasks
+        kept = await get_detail_ids_by_simple_name(product_id, failed_simple_names)
+        logger.warning(
+            f"{len(failed_simple_names)} competitive analysis tasks failed, keeping "
+            f"{len(kept)} previous records for product_id={product_id}"
+        )
+        keep_detail_ids.extend(kept)
+    operations.append(
+        DeleteMany(
+            {
+                "product_id": product_id,
+                "competitive_analysis_detail_id": {"$nin": keep_detail_ids},
+            }
+        )
+    )
     logger.info(
-        f"Removing existing competitive analysis records for product_id={product_id}"
+        f"Upserting {len(competitive_analysis_list)} competitive analysis records "
+        f"for product_id={product_id}"
     )
-    await CompetitiveAnalysis.find(
-        CompetitiveAnalysis.product_id == product_id
-    ).delete_many()
-
-    await CompetitiveAnalysis.insert_many(competitive_analysis_list)
-    logger.info("Inserted competitive analysis records into database")
+    await CompetitiveAnalysis.get_motor_collection().bulk_write(
+        operations,
+        ordered=False,
+    )
+    logger.info("Saved competitive analysis records into database")
 
     logger.info(
         f"Competitive analysis for product_id={product_id} completed successfully"
@@ -1,16 +1,18 @@
+from dataclasses import dataclass
 from pathlib import Path
 
 from loguru import logger
-from pydantic import BaseModel
-from src.infrastructure.minio import get_object
+from src.infrastructure.minio import MINIO_MAX_POOL_CONNECTIONS, stream_object
 from src.infrastructure.qdrant import search_similar
 from src.modules.product.model import Product
+from src.utils.async_gather_with_max_concurrent import async_gather_with_max_concurrent
 
 
 system_data_folder = "system_data"
 
 
-class SystemProductCompetitiveDocument(BaseModel):
+@dataclass(slots=True, frozen=True)
+class SystemProductCompetitiveDocument:
     product_name: str
     product_competitive_document: Path
     confidence_score: float
@@ -45,10 +47,31 @@ async def download_system_product_competitive_documents(
         )
         for doc_ in similar_docs
     ]
-    for doc in system_competitor_documents:
+    # Every document shares the same folder, so create it once up front
+    for folder in {
+        doc.product_competitive_document.parent for doc in system_competitor_documents
+    }:
+        folder.mkdir(parents=True, exist_ok=True)
+
+    async def download_system_product_competitive_document(
+        doc: SystemProductCompetitiveDocument,
+    ) -> None:
         logger.info(f"Downloading competitor document from MinIO with key={doc.key}")
-        raw_data = await get_object(doc.key)
-        doc.product_competitive_document.parent.mkdir(parents=True, exist_ok=True)
-        doc.product_competitive_document.write_bytes(raw_data)
+        await stream_object(doc.key, doc.product_competitive_document)
         logger.info(f"Saved competitor document to {doc.product_competitive_document}")
-    return system_competitor_documents
+
+    # Search can return the same file more than once; fetch each key once
+    unique_documents = {doc.key: doc for doc in system_competitor_documents}
+    download_results = await async_gather_with_max_concurrent(
+        [
+            download_system_product_competitive_document(doc)
+            for doc in unique_documents.values()
+        ],
+        max_concurrent=MINIO_MAX_POOL_CONNECTIONS,
+    )
+    failed_keys: set[str] = set()
+    for key, result in zip(unique_documents, download_results):
+        if isinstance(result, Exception):
+            logger.warning(f"Skipping competitor document {key}: {result}")
+            failed_keys.add(key)
+    return [doc for doc in system_competitor_documents if doc.key not in failed_keys]
@@ -1,42 +1,51 @@
+from dataclasses import dataclass
 from pathlib import Path
 from loguru import logger
-from pydantic import BaseModel
-from src.infrastructure.qdrant import embed_text
-from src.modules.competitive_analysis.storage import get_competitive_analysis_documents
-from src.modules.index_system_data.summarize_files import summarize_files
+from src.infrastructure.qdrant import embed_texts
+from src.modules.competitive_analysis.schema import CompetitiveAnalysisDocumentResponse
+from src.modules.index_system_data.summarize_files import FileSummary, summarize_files
 from src.utils.async_gather_with_max_concurrent import async_gather_with_max_concurrent
-from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
 
 
-class Document(BaseModel):
+def canon_product_name(product_name: str) -> str:
+    # Competitor names come from users and search payloads alike, so
+    # ignore case and surrounding whitespace when matching them up.
+    return product_name.strip().casefold()
+
+
+@dataclass(slots=True, frozen=True)
+class Document:
     path: Path
     key: str  # S3 key
 
 
-class UserProductCompetitiveDocument(BaseModel):
+@dataclass(slots=True, frozen=True)
+class UserProductCompetitiveDocument:
     product_name: str
     product_competitive_documents: list[Document]
     confidence_score: float
 
 
 async def download_user_product_competitive_documents(
-    product_id: str,
-    q_vector: list[float],
+    competitive_analysis_documents: list[CompetitiveAnalysisDocumentResponse],
+    q_np: np.ndarray,
     to_simple_name_map: dict[str, str],
 ) -> list[UserProductCompetitiveDocument]:
-    competitive_analysis_documents = await get_competitive_analysis_documents(
-        product_id
-    )
+    """
+    `q_np` is the unit-normalised float32 query vector of the product.
+    `to_simple_name_map` is keyed by canon_product_name.
+    """
     competitive_analysis_document_documents_dict: dict[str, list[Document]] = {}
     for competitive_analysis_document in competitive_analysis_documents:
         competitive_analysis_document_document = Document(
-            path=competitive_analysis_document.path,
+            path=Path(competitive_analysis_document.path),
             key=competitive_analysis_document.key,
         )
         competitor_name = competitive_analysis_document.competitor_name
-        if competitor_name in to_simple_name_map:
-            competitor_name = to_simple_name_map[competitor_name]
+        competitor_name = to_simple_name_map.get(
+            canon_product_name(competitor_name), competitor_name
+        )
         if competitor_name not in competitive_analysis_document_documents_dict:
             competitive_analysis_document_documents_dict[competitor_name] = []
         competitive_analysis_document_documents_dict[competitor_name].append(
@@ -46,29 +55,38 @@ async def download_user_product_competitive_documents(
             f"Added document for competitor {competitor_name}: {competitive_analysis_document_document}"
         )
 
-    async def create_user_product_competitive_document(
-        competitor_name: str,
-        documents: list[Document],
-    ) -> UserProductCompetitiveDocument:
-        paths = [doc.path for doc in documents]
-        user_upload_summary = await summarize_files(paths)
-        user_upload_summary_vector = await embed_text(user_upload_summary.summary)
-        # Ensure vectors are numpy arrays and 2D for sklearn
-        vec1 = np.array(user_upload_summary_vector).reshape(1, -1)
-        vec2 = np.array(q_vector).reshape(1, -1)
-        confidence_score = float(cosine_similarity(vec1, vec2)[0][0])
+    competitor_names = list(competitive_analysis_document_documents_dict)
+    summarize_tasks = [
+        summarize_files([doc.path for doc in documents])
+        for documents in competitive_analysis_document_documents_dict.values()
+    ]
+    summaries = await async_gather_with_max_concurrent(
+        summarize_tasks, max_concurrent=5
+    )
+    summarized: list[tuple[str, FileSummary]] = []
+    for competitor_name, summary in zip(competitor_names, summaries):
+        if isinstance(summary, Exception):
+            logger.warning(
+                f"Skipping competitor {competitor_name}: summarization failed with {summary}"
+            )
+            continue
+        summarized.append((competitor_name, summary))
+    if not summarized:
+        return []
+
+    # One embeddings request for every competitor, scored with a single GEMV
+    vectors = await embed_texts([summary.summary for _, summary in summarized])
+    v = np.asarray(vectors, dtype=np.float32)
+    v /= np.linalg.norm(v, axis=1, keepdims=True) + 1e-12
+    scores = v @ q_np
 
-        return UserProductCompetitiveDocument(
+    return [
+        UserProductCompetitiveDocument(
             product_name=competitor_name,
-            product_competitive_documents=documents,
-            confidence_score=confidence_score,
+            product_competitive_documents=competitive_analysis_document_documents_dict[
+                competitor_name
+            ],
+            confidence_score=float(score),
         )
-
-    result_tasks = [
-        create_user_product_competitive_document(competitor_name, documents)
-        for competitor_name, documents in competitive_analysis_document_documents_dict.items()
+        for (competitor_name, _), score in zip(summarized, scores)
     ]
-    product_competitive_document = await async_gather_with_max_concurrent(
-        result_tasks, max_concurrent=5
-    )
-    return product_competitive_document
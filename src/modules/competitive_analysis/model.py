@@ -1,9 +1,10 @@
 from datetime import datetime
-from beanie import Document, PydanticObjectId
+from beanie import Document
+from loguru import logger
+from pydantic import field_validator
+from pymongo import ASCENDING, IndexModel
 from src.modules.competitive_analysis.schema import (
     CompetitiveAnalysisDetailBase,
-    CompetitiveAnalysisDetailResponse,
-    CompetitiveAnalysisDetailSchema,
     CompetitiveAnalysisSource,
 )
 
@@ -19,11 +20,18 @@ class CompetitiveAnalysis(Document):
 
     class Settings:
         name = "competitive_analysis"
+        indexes = [
+            IndexModel([("product_id", ASCENDING), ("is_self_analysis", ASCENDING)]),
+            IndexModel(
+                [
+                    ("product_id", ASCENDING),
+                    ("competitive_analysis_detail_id", ASCENDING),
+                ]
+            ),
+        ]
 
-    class Config:
-        json_encoders = {
-            PydanticObjectId: str,
-        }
+
+MAX_DETAIL_LIST_LENGTH = 200
 
 
 class CompetitiveAnalysisDetail(Document, CompetitiveAnalysisDetailBase):
@@ -36,13 +44,19 @@ class CompetitiveAnalysisDetail(Document, CompetitiveAnalysisDetailBase):
     use_system_data: bool
     data_type: str
 
+    @field_validator("document_names", "sources")
+    @classmethod
+    def cap_list_length(cls, value: list) -> list:
+        if len(value) > MAX_DETAIL_LIST_LENGTH:
+            logger.warning(
+                f"Truncating {len(value)} entries to {MAX_DETAIL_LIST_LENGTH}"
+            )
+            return value[:MAX_DETAIL_LIST_LENGTH]
+        return value
+
     class Settings:
         name = "competitive_analysis_detail"
-
-    class Config:
-        json_encoders = {
-            PydanticObjectId: str,
-        }
+        indexes = ["document_hash"]
 
 
 class AnalyzeCompetitiveAnalysisProgress(Document):
@@ -53,22 +67,4 @@ class AnalyzeCompetitiveAnalysisProgress(Document):
 
     class Settings:
         name = "analyze_competitive_analysis_progress"
-
-    class Config:
-        json_encoders = {
-            PydanticObjectId: str,
-        }
-
-
-def to_competitive_analysis_detail_response(
-    ca: CompetitiveAnalysis,
-    detail: CompetitiveAnalysisDetail,
-) -> CompetitiveAnalysisDetailResponse:
-    return CompetitiveAnalysisDetailResponse(
-        id=str(ca.id),
-        product_id=ca.product_id,
-        is_self_analysis=ca.is_self_analysis,
-        details=CompetitiveAnalysisDetailSchema(
-            **detail.model_dump(),
-        ),
-    )
+        indexes = ["product_id"]
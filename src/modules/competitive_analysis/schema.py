@@ -17,7 +17,7 @@ class CompetitiveAnalysisDocumentResponse(BaseModel):
     path: str = Field(..., description="Path to the document in the local machine")
 
 
-class CompetitiveAnalysisDetailBase:
+class CompetitiveAnalysisDetailBase(BaseModel):
     k_number: str = Field(
         ..., description="FDA 510(k) K Number for the device, if available."
     )
@@ -199,7 +199,7 @@ class CompetitiveAnalysisDetailBase:
     )
 
 
-class CompetitiveAnalysisDetailSchema(BaseModel, CompetitiveAnalysisDetailBase): ...
+class CompetitiveAnalysisDetailSchema(CompetitiveAnalysisDetailBase): ...
 
 
 class CompetitiveAnalysisSource(BaseModel):
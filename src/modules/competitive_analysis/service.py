@@ -1,46 +1,75 @@
-from beanie import PydanticObjectId
-from beanie.operators import In
 from loguru import logger
 
 from src.modules.competitive_analysis.model import (
     CompetitiveAnalysis,
     CompetitiveAnalysisDetail,
-    to_competitive_analysis_detail_response,
 )
-from src.modules.competitive_analysis.schema import CompetitiveAnalysisDetailResponse
+from src.modules.competitive_analysis.schema import (
+    CompetitiveAnalysisDetailResponse,
+    CompetitiveAnalysisDetailSchema,
+)
 
 
 async def get_competitive_analysis(
     product_id: str,
 ) -> list[CompetitiveAnalysisDetailResponse]:
-    competitive_analysis = await CompetitiveAnalysis.find(
-        CompetitiveAnalysis.product_id == product_id
+    # Join each analysis to its detail server-side, leaving out the
+    # bookkeeping fields the response does not render
+    rows = await CompetitiveAnalysis.aggregate(
+        [
+            {"$match": {"product_id": product_id}},
+            {
+                "$addFields": {
+                    "_detail_oid": {"$toObjectId": "$competitive_analysis_detail_id"}
+                }
+            },
+            {
+                "$lookup": {
+                    "from": CompetitiveAnalysisDetail.Settings.name,
+                    "localField": "_detail_oid",
+                    "foreignField": "_id",
+                    "pipeline": [
+                        {
+                            "$project": {
+                                "_id": 0,
+                                "revision_id": 0,
+                                "document_hash": 0,
+                                "document_names": 0,
+                                "product_simple_name": 0,
+                                "confidence_score": 0,
+                                "sources": 0,
+                                "is_ai_generated": 0,
+                                "use_system_data": 0,
+                                "data_type": 0,
+                            }
+                        }
+                    ],
+                    "as": "detail",
+                }
+            },
+            {"$unwind": "$detail"},
+            {
+                "$project": {
+                    "product_id": 1,
+                    "is_self_analysis": 1,
+                    "detail": 1,
+                }
+            },
+        ]
     ).to_list()
-    competitive_analysis_detail_ids = [
-        PydanticObjectId(analysis.competitive_analysis_detail_id) for analysis in competitive_analysis
-    ]
-    if competitive_analysis_detail_ids:
-        competitive_analysis_details = await CompetitiveAnalysisDetail.find(
-            In(CompetitiveAnalysisDetail.id, competitive_analysis_detail_ids)
-        ).to_list()
-        logger.info(
-            f"Found {len(competitive_analysis_details)} competitive analysis details."
-        )
-    else:
-        competitive_analysis_details = []
-        logger.info("No competitive analysis details found.")
-    if not competitive_analysis_details:
+    logger.info(f"Found {len(rows)} competitive analysis details.")
+    if not rows:
         logger.warning(f"No competitive analysis details for product_id={product_id}")
         return []
 
-    competitive_analysis_details_map = {
-        str(detail.id): detail for detail in competitive_analysis_details
-    }
+    # Details were validated by CompetitiveAnalysisDetail when they were
+    # written, so build the schema without validating every row again
     return [
-        to_competitive_analysis_detail_response(
-            ca,
-            competitive_analysis_details_map[ca.competitive_analysis_detail_id],
+        CompetitiveAnalysisDetailResponse(
+            id=str(row["_id"]),
+            product_id=row["product_id"],
+            is_self_analysis=row["is_self_analysis"],
+            details=CompetitiveAnalysisDetailSchema.model_construct(**row["detail"]),
         )
-        for ca in competitive_analysis
-        if ca.competitive_analysis_detail_id in competitive_analysis_details_map
+        for row in rows
     ]
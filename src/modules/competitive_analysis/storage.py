@@ -1,5 +1,6 @@
 from typing import TypedDict
 import mimetypes
+from pathlib import Path
 from loguru import logger
 from src.infrastructure.minio import (
     generate_get_object_presigned_url,
@@ -31,9 +32,15 @@ async def analyze_competitive_analysis_document(
     analysis_document_info = analyze_analysis_document_info(document_name.split(".")[0])
     file_name = analysis_document_info["file_name"]
     url = await generate_get_object_presigned_url(obj.object_name)
-    path = await download_minio_file(obj.object_name)
-    path.rename(path.parent / file_name)
-    path = path.parent / file_name
+    # Saved under its parsed file name beside the object's /tmp folder
+    dest_path = Path(f"/tmp/{obj.object_name}").parent / file_name
+    dest_path.parent.mkdir(parents=True, exist_ok=True)
+    path = await download_minio_file(
+        obj.object_name,
+        obj.size,
+        obj.last_modified,
+        dest_path=dest_path,
+    )
     document = CompetitiveAnalysisDocumentResponse(
         document_name=document_name,
         file_name=file_name,
@@ -1,12 +1,15 @@
+import asyncio
+from pathlib import Path
 from loguru import logger
-from src.infrastructure.qdrant import add_document, delete_document, get_all_documents
+from src.environment import environment
+from src.infrastructure.qdrant import add_document, delete_documents, get_all_documents
 from src.modules.index_system_data.storage import (
     get_system_data_files,
     get_system_data_folder,
 )
-from src.modules.index_system_data.summarize_files import summarize_files
+from src.modules.index_system_data.summarize_files import summarize_files_individually
 from src.utils.async_gather_with_max_concurrent import async_gather_with_max_concurrent
-from src.utils.download_minio_files import download_minio_files
+from src.utils.download_minio_files import download_minio_file
 
 
 async def index_system_data() -> None:
@@ -15,33 +18,67 @@ async def index_system_data() -> None:
     indexed_system_data_filenames = [
         doc["filename"] for doc in indexed_system_data if doc["filename"]
     ]
-    logger.info(f"Indexed System Data: {indexed_system_data}")
-    logger.info(f"System Data Files: {system_data_files}")
+    logger.opt(lazy=True).debug("Indexed System Data: {}", lambda: indexed_system_data)
+    logger.opt(lazy=True).debug("System Data Files: {}", lambda: system_data_files)
+    indexed_filename_set = set(indexed_system_data_filenames)
+    system_data_file_set = set(system_data_files)
     files_to_index = [
-        file for file in system_data_files if file not in indexed_system_data_filenames
+        file for file in system_data_files if file not in indexed_filename_set
     ]
     files_to_unindex = [
-        file for file in indexed_system_data_filenames if file not in system_data_files
+        file
+        for file in dict.fromkeys(indexed_system_data_filenames)
+        if file not in system_data_file_set
     ]
-    logger.info(f"Files to Index: {files_to_index}")
-    logger.info(f"Files to Unindex: {files_to_unindex}")
+    logger.info(
+        f"System data: indexed={len(indexed_filename_set)} "
+        f"current={len(system_data_file_set)} "
+        f"to_index={len(files_to_index)} to_unindex={len(files_to_unindex)}"
+    )
+    logger.opt(lazy=True).debug("Files to Index: {}", lambda: files_to_index)
+    logger.opt(lazy=True).debug("Files to Unindex: {}", lambda: files_to_unindex)
 
     system_data_folder = get_system_data_folder()
-    files_to_index_keys = [f"{system_data_folder}/{file}" for file in files_to_index]
-    files_to_index_paths = await download_minio_files(files_to_index_keys)
-    files_to_index_summarize_tasks = [
-        summarize_files([file_path]) for file_path in files_to_index_paths
-    ]
-    files_to_index_summaries = await async_gather_with_max_concurrent(
-        files_to_index_summarize_tasks,
+    # Every file lands in the same folder, so create it once up front
+    download_root = Path("/tmp") / system_data_folder
+    download_root.mkdir(parents=True, exist_ok=True)
+    key_prefix = f"{system_data_folder}/"
+
+    async def index_files(files: list[str]) -> None:
+        # Each batch is downloaded, summarised in one call and indexed on
+        # its own, so a slow batch never holds back the others
+        results = await asyncio.gather(
+            *[
+                download_minio_file(key_prefix + file, dest_path=download_root / file)
+                for file in files
+            ],
+            return_exceptions=True,
+        )
+        file_paths: list[Path] = []
+        for file, result in zip(files, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Failed to download {file}, skipping: {result}")
+                continue
+            file_paths.append(result)
+        summaries = await summarize_files_individually(file_paths)
+        await asyncio.gather(
+            *[
+                add_document(file_path.name, summaries[file_path])
+                for file_path in file_paths
+                if file_path in summaries
+            ]
+        )
+
+    batch_size = environment.index_system_data_summary_batch_size
+    await async_gather_with_max_concurrent(
+        [
+            index_files(files_to_index[i : i + batch_size])
+            for i in range(0, len(files_to_index), batch_size)
+        ],
+        max_concurrent=environment.index_system_data_max_concurrent,
+        task_name="INDEX_SYSTEM_DATA",
     )
-    add_document_tasks = [
-        add_document(file_path.name, summary)
-        for file_path, summary in zip(files_to_index_paths, files_to_index_summaries)
-    ]
-    await async_gather_with_max_concurrent(add_document_tasks)
 
     # 4) remove deleted files from Qdrant
-    for filename in files_to_unindex:
-        delete_document(filename)
-        logger.info(f"  • removed {filename}")
+    await delete_documents(files_to_unindex)
+    logger.info(f"Removed {len(files_to_unindex)} files from the index")
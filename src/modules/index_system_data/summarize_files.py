@@ -1,8 +1,55 @@
+import asyncio
+import hashlib
+from collections import OrderedDict
+from datetime import timedelta
 from pathlib import Path
 from loguru import logger
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 
+from src.environment import environment
+from src.infrastructure.redis import redis_client
 from src.services.openai.extract_files_data import extract_files_data
+from src.utils.hash_document_paths import hash_document_paths
+
+SUMMARY_CACHE_SIZE = 256
+SUMMARY_CACHE_TTL = timedelta(days=30)
+
+SUMMARY_SYSTEM_INSTRUCTION = (
+    "You are an FDA subject-matter expert. For each attached PDF device form, "
+    "extract the product name and file name. Then, provide:\n"
+    "1. A list called 'files', with one object per file containing 'file_name' and 'product_name'.\n"
+    "2. A field called 'summary', which is a concise 5-7 sentence summary focusing on the devices’ overall purpose and key features.\n"
+    "Return your answer strictly as JSON matching the required schema."
+)
+SUMMARY_USER_QUESTION = (
+    "Read all attached PDFs and respond with a JSON including: "
+    "1) 'files' (list of file_name and extracted product_name per file), "
+    "2) 'summary' (overall combined summary)."
+)
+PER_FILE_SUMMARY_SYSTEM_INSTRUCTION = (
+    "You are an FDA subject-matter expert. The attached PDF device forms are unrelated; "
+    "treat each one separately. For every attached file provide its exact 'file_name', "
+    "the 'product_name' it describes, and a 'summary' of that file alone: a concise 5-7 "
+    "sentence summary focusing on the device's purpose and key features.\n"
+    "Return your answer strictly as JSON matching the required schema."
+)
+PER_FILE_SUMMARY_USER_QUESTION = (
+    "Read each attached PDF and respond with a JSON containing 'files': one entry "
+    "per attached file with 'file_name', 'product_name' and 'summary'."
+)
+
+# Cached summaries are only valid for the model and prompts that produced them
+_PROMPT_HASH = hashlib.sha256(
+    "\0".join(
+        [
+            environment.openai_model,
+            SUMMARY_SYSTEM_INSTRUCTION,
+            SUMMARY_USER_QUESTION,
+            PER_FILE_SUMMARY_SYSTEM_INSTRUCTION,
+            PER_FILE_SUMMARY_USER_QUESTION,
+        ]
+    ).encode()
+).hexdigest()[:16]
 
 
 class FileProductName(BaseModel):
@@ -15,6 +62,12 @@ class FileSummary(BaseModel):
     summary: str
 
 
+# The same document sets are summarised again on every re-run, so keep
+# recent summaries in memory, backed by Redis so they survive restarts
+# and are shared between workers.
+_summary_cache: OrderedDict[str, FileSummary] = OrderedDict()
+
+
 async def summarize_files(paths: list[Path]) -> FileSummary:
     """
     Upload all PDFs in `paths` and use extract_files_data to get a summary and per-file product names.
@@ -22,26 +75,17 @@ async def summarize_files(paths: list[Path]) -> FileSummary:
     if not paths:
         return FileSummary(files=[], summary="No documents to summarize.")
 
-    # Define the system instruction and user question for the assistant
-    system_instruction = (
-        "You are an FDA subject-matter expert. For each attached PDF device form, "
-        "extract the product name and file name. Then, provide:\n"
-        "1. A list called 'files', with one object per file containing 'file_name' and 'product_name'.\n"
-        "2. A field called 'summary', which is a concise 5-7 sentence summary focusing on the devices’ overall purpose and key features.\n"
-        "Return your answer strictly as JSON matching the required schema."
-    )
-
-    user_question = (
-        "Read all attached PDFs and respond with a JSON including: "
-        "1) 'files' (list of file_name and extracted product_name per file), "
-        "2) 'summary' (overall combined summary)."
-    )
+    cache_key = await _summary_cache_key(paths)
+    cached = await _get_cached_summary(cache_key)
+    if cached is not None:
+        logger.info(f"Summary cache hit for [{', '.join([p.name for p in paths])}]")
+        return cached
 
     # Call extract_files_data, which handles upload, query, cleanup, and schema validation
     result = await extract_files_data(
         file_paths=paths,
-        system_instruction=system_instruction,
-        user_question=user_question,
+        system_instruction=SUMMARY_SYSTEM_INSTRUCTION,
+        user_question=SUMMARY_USER_QUESTION,
         model_class=FileSummary,
     )
 
@@ -52,5 +96,126 @@ async def summarize_files(paths: list[Path]) -> FileSummary:
     ]
     summary = result.summary
 
-    logger.info(f"Final summary for [{', '.join([p.name for p in paths])}]: {summary}")
-    return FileSummary(files=files, summary=summary)
+    logger.info(f"Summarised {len(paths)} files")
+    logger.opt(lazy=True).debug(
+        "Final summary for [{}]: {}",
+        lambda: ", ".join(p.name for p in paths),
+        lambda: summary,
+    )
+    file_summary = FileSummary(files=files, summary=summary)
+    await _cache_summary(cache_key, file_summary)
+    return file_summary
+
+
+class FileDescription(BaseModel):
+    file_name: str
+    product_name: str
+    summary: str
+
+
+class FileDescriptions(BaseModel):
+    files: list[FileDescription]
+
+
+async def summarize_files_individually(paths: list[Path]) -> dict[Path, FileSummary]:
+    """
+    Summarise every file in `paths` on its own, but with one extraction call
+    for the files not already cached. Files the model leaves out of its
+    answer are summarised separately, and files that cannot be summarised
+    at all are left out of the result.
+    """
+    if not paths:
+        return {}
+
+    cache_keys = await asyncio.gather(*[_summary_cache_key([path]) for path in paths])
+    summaries: dict[Path, FileSummary] = {}
+    for path, cache_key in zip(paths, cache_keys):
+        cached = await _get_cached_summary(cache_key)
+        if cached is not None:
+            logger.info(f"Summary cache hit for {path.name}")
+            summaries[path] = cached
+    uncached_paths = [path for path in paths if path not in summaries]
+    if not uncached_paths:
+        return summaries
+
+    try:
+        result = await extract_files_data(
+            file_paths=uncached_paths,
+            system_instruction=PER_FILE_SUMMARY_SYSTEM_INSTRUCTION,
+            user_question=PER_FILE_SUMMARY_USER_QUESTION,
+            model_class=FileDescriptions,
+        )
+    except Exception as e:
+        # Fall back to summarising each file alone below
+        logger.warning(f"Batched summary failed, summarising files alone: {e}")
+        result = FileDescriptions(files=[])
+
+    # Uploads may be converted to PDF, so match on the name without suffix
+    paths_by_stem = {path.stem: path for path in uncached_paths}
+    cache_keys_by_path = dict(zip(paths, cache_keys))
+    for description in result.files:
+        path = paths_by_stem.get(Path(description.file_name).stem)
+        if path is None or path in summaries:
+            continue
+        summaries[path] = FileSummary(
+            files=[
+                FileProductName(
+                    file_name=path.name, product_name=description.product_name
+                )
+            ],
+            summary=description.summary,
+        )
+        await _cache_summary(cache_keys_by_path[path], summaries[path])
+
+    for path in uncached_paths:
+        if path not in summaries:
+            logger.warning(f"No batched summary for {path.name}, summarising alone")
+            try:
+                summaries[path] = await summarize_files([path])
+            except Exception as e:
+                logger.warning(f"Failed to summarise {path.name}, skipping: {e}")
+    return summaries
+
+
+async def _summary_cache_key(paths: list[Path]) -> str:
+    document_hash = await asyncio.to_thread(hash_document_paths, paths)
+    file_names = "/".join(sorted(p.name for p in paths))
+    return f"file_summary:{_PROMPT_HASH}:{document_hash}:{file_names}"
+
+
+async def _get_cached_summary(cache_key: str) -> FileSummary | None:
+    cached = _summary_cache.get(cache_key)
+    if cached is not None:
+        _summary_cache.move_to_end(cache_key)
+        return cached.model_copy(deep=True)
+    try:
+        raw = await redis_client.get(cache_key)
+    except Exception as e:
+        logger.warning(f"Failed to read summary cache: {e}")
+        return None
+    if raw is None:
+        return None
+    try:
+        cached = FileSummary.model_validate_json(raw)
+    except ValidationError as e:
+        logger.warning(f"Ignoring unreadable summary cache entry: {e}")
+        return None
+    _remember_summary(cache_key, cached)
+    return cached.model_copy(deep=True)
+
+
+async def _cache_summary(cache_key: str, summary: FileSummary) -> None:
+    _remember_summary(cache_key, summary)
+    try:
+        await redis_client.set(
+            cache_key, summary.model_dump_json(), ex=SUMMARY_CACHE_TTL
+        )
+    except Exception as e:
+        logger.warning(f"Failed to write summary cache: {e}")
+
+
+def _remember_summary(cache_key: str, summary: FileSummary) -> None:
+    _summary_cache[cache_key] = summary.model_copy(deep=True)
+    _summary_cache.move_to_end(cache_key)
+    while len(_summary_cache) > SUMMARY_CACHE_SIZE:
+        _summary_cache.popitem(last=False)
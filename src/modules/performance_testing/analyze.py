@@ -1,22 +1,26 @@
 """
-1. Single assistant instance with 12 tools (analytical, comparison, clinical …)
-2. `_generic_extract()` drives the loop and validation.
+1. One Responses API call per section (analytical, comparison, clinical …),
+   answering in that section's JSON schema with file_search over the docs.
+2. `_generic_extract()` drives the call and validation.
 3. Thin wrappers list which files to pass and which schema / attr to use.
 """
 
 from __future__ import annotations
 
-import json
-from datetime import datetime, timezone
+import hashlib
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import List, Optional, Sequence
-import httpx
+from typing import List, Optional, Sequence, get_origin
+import orjson
 import asyncio
-import io
 import re
+import tempfile
 from loguru import logger
+from openai import NotFoundError
+from pydantic import BaseModel
 
-from src.infrastructure.openai import get_openai_client_sync
+from src.infrastructure.http import http_client
+from src.infrastructure.openai import get_openai_client
 from src.infrastructure.redis import redis_client
 
 from src.modules.performance_testing.storage import (
@@ -85,33 +89,122 @@ class AnalyzePTProgress:
     async def tick(self, n: int = 1) -> None:
         if not self.doc:
             return
-        self.doc.processed_files += n
-        self.doc.updated_at = datetime.now(timezone.utc)
-        await self.doc.save()
+        # $inc so concurrent sections never lose each other's ticks
+        await self._update({"$inc": {"processed_files": n}})
 
     async def done(self) -> None:
         if not self.doc:
             return
-        self.doc.processed_files = self.doc.total_files
-        self.doc.updated_at = datetime.now(timezone.utc)
-        await self.doc.save()
+        await self._update({"$set": {"processed_files": self.doc.total_files}})
 
     async def err(self) -> None:
         if not self.doc:
             return
-        self.doc.processed_files = -1
-        self.doc.updated_at = datetime.now(timezone.utc)
-        await self.doc.save()
+        await self._update({"$set": {"processed_files": -1}})
         logger.error("Progress marked as errored for {}", self.doc.product_id)
 
+    async def _update(self, update: dict) -> None:
+        """Apply `update` in place instead of re-saving the whole document."""
+        update.setdefault("$set", {})["updated_at"] = datetime.now(timezone.utc)
+        await AnalyzePerformanceTestingProgress.get_motor_collection().update_one(
+            {"_id": self.doc.id}, update
+        )
+
 
 # ───────── helpers ───────────────────────────────────────────
-async def _get_or_create(pid: str) -> PerformanceTesting:
-    doc = await PerformanceTesting.find_one({"product_id": pid})
-    if not doc:
-        doc = PerformanceTesting(product_id=pid)
-        await doc.insert()
-    return doc
+# Sections of one product are extracted concurrently; at most this many
+# OpenAI calls are in flight at a time.
+SECTION_MAX_CONCURRENT = 6
+
+# A section that fails validation is sent back to the model with the
+# error this many times before it is dropped
+VALIDATION_RETRIES = 2
+VALIDATION_RETRY_DELAY = 1.0
+
+# Extracted sections are cached by the bytes of the uploaded files, the
+# tool and its schema. Bump PROMPT_VERSION whenever the prompts or the
+# extraction instructions change so stale extractions are not reused.
+PROMPT_VERSION = "v3"
+EXTRACTION_CACHE_TTL = timedelta(days=7)
+# Shorter than the 7-day idle expiry of the vector store itself, so a
+# cached id never points at an expired store
+VECTOR_STORE_CACHE_TTL = timedelta(days=6)
+
+# Documents are spooled in memory up to this size before going to disk
+UPLOAD_SPOOL_MAX_SIZE = 8 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 64 * 1024
+UPLOAD_MAX_CONCURRENT = 8
+
+
+# PerformanceTesting slots holding one study per section run; the others
+# hold a single object that each run replaces
+_LIST_SLOTS = {
+    name
+    for name, field in PerformanceTesting.model_fields.items()
+    if get_origin(field.annotation) is list
+}
+
+
+async def _save_sections(pid: str, sections: list[tuple[str, BaseModel]]) -> None:
+    """
+    Write every extracted section of the analysis in one atomic upsert.
+    """
+    to_set: dict = {"updated_at": datetime.utcnow()}
+    to_push: dict = {}
+    for attr_name, obj in sections:
+        value = obj.model_dump(by_alias=True)
+        if attr_name in _LIST_SLOTS:
+            to_push.setdefault(attr_name, {"$each": []})["$each"].append(value)
+        else:
+            to_set[attr_name] = value
+    update = {
+        "$set": to_set,
+        "$setOnInsert": PerformanceTesting(product_id=pid).model_dump(
+            exclude={"id", "revision_id", *to_set, *to_push}
+        ),
+    }
+    if to_push:
+        update["$push"] = to_push
+    await PerformanceTesting.get_motor_collection().update_one(
+        {"product_id": pid}, update, upsert=True
+    )
+
+
+def _apply_to_plan(plan: PerformanceTestPlan, attr_name: str, obj) -> None:
+    """Copy an extracted section onto its matching card of the test‑plan."""
+    for card in plan.tests:
+        same_section = card.section_key == attr_name
+        same_code = getattr(obj, "study_type", None) == card.test_code
+        if same_section and (card.test_code is None or same_code):
+            # ▸ rationale / confidence
+            card.ai_rationale = getattr(obj, "discussion", None) or getattr(
+                obj, "conclusion", None
+            )
+            if getattr(obj, "confidence", None) is not None:
+                perc = int(obj.confidence * 100)
+                card.ai_confident = perc
+                card.confident_level = (
+                    PerformanceTestingConfidentLevel.HIGH
+                    if perc >= 80
+                    else PerformanceTestingConfidentLevel.MEDIUM
+                    if perc >= 50
+                    else PerformanceTestingConfidentLevel.LOW
+                )
+            # ▸ references / standards
+            # refs = getattr(obj, "consensus_standards", [])
+            # refs = _ensure_list(getattr(obj, "consensus_standards", None))
+            # card.references           = refs
+            # card.associated_standards = refs
+            raw = _ensure_list(getattr(obj, "consensus_standards", None))
+            # turn each string into the required Pydantic objects
+            card.references = [PerformanceTestingReference(title=s) for s in raw]
+            card.associated_standards = [
+                PerformanceTestingAssociatedStandard(name=s) for s in raw
+            ]
+
+            # ▸ status
+            card.status = TestStatus.SUGGESTED  # Suggested by AI
+            break
 
 
 async def _maybe_upload_local_file(client, ids: List[str]) -> List[str]:
@@ -119,92 +212,187 @@ async def _maybe_upload_local_file(client, ids: List[str]) -> List[str]:
         return ids
     pdf = Path("dev_assets/perf_testing_dummy.pdf")
     with pdf.open("rb") as fh:
-        fid = client.files.create(file=fh, purpose="assistants").id
+        uploaded = await client.files.create(file=fh, purpose="assistants")
+    fid = uploaded.id
     logger.info("🔄 Using local PDF {} → {}", pdf.name, fid)
     return [fid]
 
 
-async def _upload_via_url(client, url: str, filename: str) -> str:
+async def _upload_via_url(client, url: str, filename: str) -> tuple[str, str]:
     """
     Download a doc from MinIO (via pre-signed URL) and push it to
-    OpenAI's /files endpoint. Returns the new file-ID.
+    OpenAI's /files endpoint. Returns the new file-ID and the sha256
+    of the uploaded bytes.
     """
 
-    async with httpx.AsyncClient() as http:
-        r = await http.get(url, timeout=60)
-        r.raise_for_status()
-    bio = io.BytesIO(r.content)
-    bio.name = filename  # important so GPT “sees” the name
-    uploaded = client.files.create(file=bio, purpose="assistants")
-    return uploaded.id
+    digest = hashlib.sha256()
+    # Spooled so small PDFs stay in memory and large ones go to disk,
+    # instead of holding the whole body in RAM twice
+    with tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MAX_SIZE) as spool:
+        async with http_client.stream("GET", url) as r:
+            r.raise_for_status()
+            async for chunk in r.aiter_bytes(UPLOAD_CHUNK_SIZE):
+                spool.write(chunk)
+                digest.update(chunk)
+        spool.seek(0)
+        # the filename is important so GPT “sees” the name
+        uploaded = await client.files.create(
+            file=(filename, spool), purpose="assistants"
+        )
+    return uploaded.id, digest.hexdigest()
+
+
+def _files_digest(file_hashes: List[str]) -> str:
+    """
+    Digest of the bytes behind every document of an analysis, given the
+    sha256 of each uploaded file.
+    """
+    return hashlib.sha256("".join(sorted(file_hashes)).encode()).hexdigest()
+
+
+def _extraction_cache_key(files: str | None, tool_name: str) -> str | None:
+    if files is None:
+        return None
+    schema_hash = _SCHEMA_HASHES[tool_name]
+    return f"pt:extract:{files}:{tool_name}:{PROMPT_VERSION}:{schema_hash}"
+
+
+async def _get_cached_extraction(cache_key: str | None) -> dict | None:
+    if cache_key is None:
+        return None
+    try:
+        raw = await redis_client.get(cache_key)
+    except Exception as e:
+        logger.warning(f"Failed to read extraction cache: {e}")
+        return None
+    if raw is None:
+        return None
+    try:
+        record = orjson.loads(raw)
+    except orjson.JSONDecodeError as e:
+        logger.warning(f"Ignoring unreadable extraction cache entry: {e}")
+        await _drop_cached_extraction(cache_key)
+        return None
+    if not isinstance(record, dict):
+        await _drop_cached_extraction(cache_key)
+        return None
+    return record
+
+
+async def _drop_cached_extraction(cache_key: str | None) -> None:
+    if cache_key is None:
+        return
+    try:
+        await redis_client.delete(cache_key)
+    except Exception as e:
+        logger.warning(f"Failed to drop extraction cache entry: {e}")
+
+
+async def _cache_extraction(cache_key: str | None, record: dict) -> None:
+    if cache_key is None:
+        return
+    try:
+        await redis_client.set(
+            cache_key, orjson.dumps(record), ex=EXTRACTION_CACHE_TTL
+        )
+    except Exception as e:
+        logger.warning(f"Failed to write extraction cache: {e}")
+
+
+_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$", re.I)
+_CITATION = re.compile(r"【.*?】")
+_LIST_SEPARATOR = re.compile(r"[;,]")
+
+
+def _first_json_object(txt: str) -> str | None:
+    """
+    The first balanced {...} block of `txt`, found in one pass that skips
+    braces inside string literals.
+    """
+    start = txt.find("{")
+    if start < 0:
+        return None
+    depth = 0
+    in_string = escaped = False
+    for i in range(start, len(txt)):
+        c = txt[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif c == "\\":
+                escaped = True
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+        elif c == "{":
+            depth += 1
+        elif c == "}":
+            depth -= 1
+            if depth == 0:
+                return txt[start : i + 1]
+    return None
 
 
 def _robust_json(txt: str) -> dict:
     """
-    1. plain json.loads()
+    1. plain orjson.loads()
     2. strip code-fences / pick first balanced {...}
     3. final fallback: parse_openai_json()  (removes trailing text, etc.)
     """
     try:
-        return json.loads(txt)
-    except json.JSONDecodeError:
+        return orjson.loads(txt)
+    except orjson.JSONDecodeError:
         # common pattern: ```json … ```
-        if txt.startswith("```"):
-            txt = txt.strip("` \n")
-            if txt.lower().startswith("json"):
-                txt = txt[4:].lstrip()  # drop leading “json”
+        txt = _FENCE.sub("", txt.strip())
         # grab the first {...} block
-        m = re.search(r"\{.*\}", txt, flags=re.S)
-        if m:
+        block = _first_json_object(txt)
+        if block:
             try:
-                return json.loads(m.group(0))
+                return orjson.loads(block)
             except Exception:
                 pass  # fall through
         # last resort – very tolerant but slower
         return parse_openai_json(txt)
 
 
-# ───────── assistant ────────────────────────────────────────
-async def _assistant_id(client) -> str:
-    tools = [
-        {"type": "file_search"},
-    ]
-    mapping = {
-        "submit_analytical_section": AnalyticalStudy,
-        "submit_comparison_section": ComparisonStudy,
-        "submit_clinical_section": ClinicalStudy,
-        "submit_animal_section": AnimalTesting,
-        "submit_emc_section": EMCSafety,
-        "submit_wireless_section": WirelessCoexistence,
-        "submit_software_section": SoftwarePerformance,
-        "submit_interop_section": Interoperability,
-        "submit_biocomp_section": Biocompatibility,
-        "submit_sterility_section": SterilityValidation,
-        "submit_shelf_life_section": ShelfLife,
-        "submit_cyber_section": CyberSecurity,
-    }
-    for name, cls in mapping.items():
-        tools.append({
-            "type": "function",
-            "function": {
-                "name": name,
-                "description": f"Return {cls.__name__} JSON.",
-                "parameters": cls.model_json_schema(by_alias=True),
-            },
-        })
-
-    assistant = client.beta.assistants.create(
-        name="Performance‑Testing extractor",
-        model="gpt-4o",
-        instructions=(
-            "You are an FDA performance-testing analyst. For each question‑naire "
-            "section respond ONLY by calling the matching function tool named "
-            "'submit_*_section'. If no data for a section, set performed=false "
-            "or return key_results='not available'. Never reply with free text."
-        ),
-        tools=tools,
-    )
-    return assistant.id, mapping
+# ───────── sections ─────────────────────────────────────────
+_MAPPING = {
+    "submit_analytical_section": AnalyticalStudy,
+    "submit_comparison_section": ComparisonStudy,
+    "submit_clinical_section": ClinicalStudy,
+    "submit_animal_section": AnimalTesting,
+    "submit_emc_section": EMCSafety,
+    "submit_wireless_section": WirelessCoexistence,
+    "submit_software_section": SoftwarePerformance,
+    "submit_interop_section": Interoperability,
+    "submit_biocomp_section": Biocompatibility,
+    "submit_sterility_section": SterilityValidation,
+    "submit_shelf_life_section": ShelfLife,
+    "submit_cyber_section": CyberSecurity,
+}
+
+# model_json_schema walks the whole nested model; build every schema once
+_SCHEMAS = {
+    name: cls.model_json_schema(by_alias=True) for name, cls in _MAPPING.items()
+}
+_SCHEMA_HASHES = {
+    name: hashlib.sha256(
+        orjson.dumps(schema, option=orjson.OPT_SORT_KEYS)
+    ).hexdigest()[:16]
+    for name, schema in _SCHEMAS.items()
+}
+
+EXTRACTION_MODEL = "gpt-4o"
+EXTRACTION_INSTRUCTIONS = (
+    "You are an FDA performance-testing analyst. Answer ONLY with JSON in "
+    "the requested schema, using the attached documents. Without data, set "
+    "performed=false or key_results='not available'."
+)
+# Caps a runaway answer; a full section is well under this
+EXTRACTION_MAX_OUTPUT_TOKENS = 8192
+# Replies larger than this are decoded in a worker thread
+JSON_OFFLOAD_SIZE = 16 * 1024
 
 
 def _ensure_list(value: str | list | None) -> list[str]:
@@ -219,78 +407,167 @@ def _ensure_list(value: str | list | None) -> list[str]:
     if isinstance(value, list):
         return value
     # drop citation brackets and split on comma / semicolon
-    clean = re.sub(r"【.*?】", "", value)  # keeps your earlier `import re`
-    parts = re.split(r"[;,]", clean)
+    clean = _CITATION.sub("", value)
+    parts = _LIST_SEPARATOR.split(clean)
     return [p.strip() for p in parts if p.strip()]
 
 
+# ───────── vector store ──────────────────────────────────────
+async def _vector_store_id(
+    client, attachments: List[str], files: str | None
+) -> str:
+    """
+    One vector store holds every document of the analysis, so the files are
+    indexed once and shared by all section calls. Stores of identical
+    documents (same `files` digest) are reused from redis; OpenAI expires
+    them after a week idle.
+    """
+    cache_key = _vector_store_cache_key(files)
+    if cache_key:
+        cached = await _get_cached_vector_store(client, cache_key)
+        if cached is not None:
+            return cached
+
+    vector_store = await client.vector_stores.create(
+        name="Performance‑Testing documents",
+        expires_after={"anchor": "last_active_at", "days": 7},
+    )
+    # file_search only sees files that finished processing
+    batch = await client.vector_stores.file_batches.create_and_poll(
+        vector_store_id=vector_store.id,
+        file_ids=attachments,
+    )
+    if batch.status != "completed":
+        logger.warning(
+            "Vector store {} indexing ended as {}; not caching it",
+            vector_store.id,
+            batch.status,
+        )
+        return vector_store.id
+    if cache_key:
+        try:
+            await redis_client.set(
+                cache_key, vector_store.id, ex=VECTOR_STORE_CACHE_TTL
+            )
+        except Exception as e:
+            logger.warning(f"Failed to write vector store cache: {e}")
+    return vector_store.id
+
+
+def _vector_store_cache_key(files: str | None) -> str | None:
+    return f"pt:vector_store:{files}" if files else None
+
+
+async def _get_cached_vector_store(client, cache_key: str) -> str | None:
+    """
+    Cached vector store id, or None when there is none or the store is no
+    longer usable on OpenAI's side (its cache entry is then dropped).
+    """
+    try:
+        cached = await redis_client.get(cache_key)
+    except Exception as e:
+        logger.warning(f"Failed to read vector store cache: {e}")
+        return None
+    if cached is None:
+        return None
+    vector_store_id = cached.decode()
+    try:
+        vector_store = await client.vector_stores.retrieve(vector_store_id)
+        usable = vector_store.status == "completed"
+    except Exception as e:
+        logger.warning(f"Failed to retrieve vector store {vector_store_id}: {e}")
+        usable = False
+    if usable:
+        return vector_store_id
+    await _forget_vector_store(cache_key)
+    return None
+
+
+async def _forget_vector_store(cache_key: str | None) -> None:
+    if cache_key is None:
+        return
+    try:
+        await redis_client.delete(cache_key)
+    except Exception as e:
+        logger.warning(f"Failed to drop vector store cache: {e}")
+
+
 # ───────── generic extractor ─────────────────────────────────
+async def _run_extraction(
+    client,
+    vector_store_id: str,
+    tool_name: str,
+    prompt: str,
+    previous_response_id: str | None = None,
+) -> tuple[str, dict | None]:
+    """
+    Ask for one section as JSON in its schema, in a single round-trip.
+    Returns the response id, so a follow-up turn can continue from it,
+    along with the raw record.
+    """
+    kwargs = {}
+    if previous_response_id:
+        kwargs["previous_response_id"] = previous_response_id
+    response = await client.responses.create(
+        model=EXTRACTION_MODEL,
+        instructions=EXTRACTION_INSTRUCTIONS,
+        input=prompt,
+        max_output_tokens=EXTRACTION_MAX_OUTPUT_TOKENS,
+        tools=[{"type": "file_search", "vector_store_ids": [vector_store_id]}],
+        text={
+            "format": {
+                "type": "json_schema",
+                "name": tool_name,
+                "schema": _SCHEMAS[tool_name],
+                # the section models are not strict-mode compatible
+                "strict": False,
+            }
+        },
+        **kwargs,
+    )
+    text = response.output_text
+    try:
+        if len(text) > JSON_OFFLOAD_SIZE:
+            # the regex / tolerant fallbacks can take a while on big replies
+            record = await asyncio.to_thread(_robust_json, text)
+        else:
+            record = _robust_json(text)
+    except Exception as exc:
+        logger.warning("{}: unreadable JSON: {}", tool_name, exc)
+        record = None
+    return response.id, record
+
+
 async def _generic_extract(
     client,
-    assistant_id: str,
     product_id: str,
     attachments: List[str],
+    vector_store_id: str | None,
+    files: str | None,
     tool_name: str,
     schema_cls,
     attr_name: str,
     prompt: str,
     progress: AnalyzePTProgress | None = None,
-):
-    attachments = await _maybe_upload_local_file(client, attachments)
-    if not attachments:
+) -> tuple[str, BaseModel] | None:
+    """
+    Extract one section and return it with its PerformanceTesting
+    attribute; saving is left to the caller so all sections share a write.
+    """
+    if not attachments or vector_store_id is None:
         logger.warning("No files for {}", tool_name)
         return
 
-    thread = client.beta.threads.create()
-    client.beta.threads.messages.create(
-        thread_id=thread.id,
-        role="user",
-        content=prompt,
-        attachments=[
-            {"file_id": fid, "tools": [{"type": "file_search"}]} for fid in attachments
-        ],
-    )
-
-    run = client.beta.threads.runs.create(
-        thread_id=thread.id, assistant_id=assistant_id
-    )
-    record: dict | None = None
-
-    for _ in range(120):
-        run = client.beta.threads.runs.retrieve(thread_id=thread.id, run_id=run.id)
-        if run.status == "requires_action":
-            outs = []
-            calls = run.required_action.submit_tool_outputs.tool_calls
-            for tc in calls:
-                if tc.type == "function" and tc.function.name == tool_name:
-                    if record is None:
-                        arg = tc.function.arguments
-                        record = _robust_json(arg) if isinstance(arg, str) else arg
-                    outs.append({"tool_call_id": tc.id, "output": "received"})
-                elif tc.type == "file_search":
-                    outs.append({
-                        "tool_call_id": tc.id,
-                        "output": {"data": [{"page": 1, "snippet": ""}]},
-                    })
-            client.beta.threads.runs.submit_tool_outputs(
-                thread_id=thread.id, run_id=run.id, tool_outputs=outs
-            )
-        elif run.status in ("completed", "failed", "cancelled", "expired"):
-            break
-        await asyncio.sleep(5)
-
-    # fallback plain‑text JSON
-    if record is None:
-        for msg in client.beta.threads.messages.list(thread_id=thread.id).data:
-            if msg.role == "assistant":
-                try:
-                    record = json.loads(msg.content[0].text.value)
-                    break
-                except Exception:
-                    continue
-    if record is None:
-        logger.warning("{}: no JSON returned", tool_name)
-        return
+    cache_key = _extraction_cache_key(files, tool_name)
+    response_id: str | None = None
+    record = await _get_cached_extraction(cache_key)
+    from_cache = record is not None
+    if from_cache:
+        logger.info("Extraction cache hit for {} ({})", tool_name, product_id)
+    else:
+        response_id, record = await _run_extraction(
+            client, vector_store_id, tool_name, prompt
+        )
 
     # key normalisation
     """attachments = record.pop("attachments", None)
@@ -301,134 +578,158 @@ async def _generic_extract(
     if pages:
         record["page_refs"] = [p.get("page") for p in pages if p]
     """
-    # normalize empty lists if model omitted fields.
-    record.setdefault("attachments", [])
-    record.setdefault("pages", [])
+    attempt = 0
+    while True:
+        if record is None:
+            logger.warning("{}: no JSON returned", tool_name)
+            return
+        # normalize empty lists if model omitted fields.
+        record.setdefault("attachments", [])
+        record.setdefault("pages", [])
+        try:
+            obj = await asyncio.to_thread(schema_cls.model_validate, record)
+            break
+        except Exception as exc:
+            if from_cache:
+                # stale entry from an older schema: drop it and extract afresh
+                logger.warning("{}: ignoring stale cache entry: {}", tool_name, exc)
+                await _drop_cached_extraction(cache_key)
+                from_cache = False
+                response_id, record = await _run_extraction(
+                    client, vector_store_id, tool_name, prompt
+                )
+                continue
+            if response_id is None or attempt >= VALIDATION_RETRIES:
+                logger.warning("{} validation failed: {}\n{}", tool_name, exc, record)
+                return
+            # let the model correct itself in the same conversation
+            attempt += 1
+            logger.warning(
+                "{} validation failed, retry {}/{}: {}",
+                tool_name,
+                attempt,
+                VALIDATION_RETRIES,
+                exc,
+            )
+            await asyncio.sleep(VALIDATION_RETRY_DELAY * attempt)
+            response_id, record = await _run_extraction(
+                client,
+                vector_store_id,
+                tool_name,
+                f"Your {tool_name} output failed validation: {exc}. "
+                "Answer again with corrected JSON.",
+                previous_response_id=response_id,
+            )
 
-    try:
-        obj = schema_cls.parse_obj(record)
-        logger.info("🔍 {} JSON:\n{}", tool_name, json.dumps(record, indent=2))
-    except Exception as exc:
-        logger.warning("{} validation failed: {}", tool_name, exc)
-        return
+    logger.opt(lazy=True).debug(
+        "🔍 {} JSON:\n{}",
+        lambda: tool_name,
+        lambda: orjson.dumps(record, option=orjson.OPT_INDENT_2).decode(),
+    )
 
-    doc = await _get_or_create(product_id)
-    # getattr(doc, attr_name).append(obj)
+    await _cache_extraction(cache_key, record)
 
-    slot = getattr(doc, attr_name)
-    if isinstance(slot, list):
-        slot.append(obj)
-    else:
-        setattr(doc, attr_name, obj)
+    logger.info("✅ Extracted {} section for {}", tool_name, product_id)
+    return attr_name, obj
+
+
+# ───────── thin wrappers for each questionnaire section ──────
+PROMPTS = {
+    # the fields to populate come with the section's JSON schema
+    "submit_analytical_section": "Extract analytical-performance data. "
+    "Use 'not available' for any field you cannot populate.",
+    "submit_comparison_section": "Extract method/matrix comparison study data.",
+    "submit_clinical_section": "Extract clinical-performance study data.",
+    "submit_animal_section": "Extract GLP animal testing data.",
+    "submit_emc_section": "Extract EMC / electrical-safety data.",
+    "submit_wireless_section": "Extract wireless-coexistence data.",
+    "submit_software_section": "Extract software performance data.",
+    "submit_interop_section": "Extract interoperability data.",
+    "submit_biocomp_section": "Extract biocompatibility data.",
+    "submit_sterility_section": "Extract sterility validation data.",
+    "submit_shelf_life_section": "Extract shelf-life / aging data.",
+    "submit_cyber_section": "Extract cyber-security data.",
+}
+
+# PerformanceTesting attribute each section is stored under
+_SECTION_ATTRS = {
+    "submit_analytical_section": "analytical",
+    "submit_comparison_section": "comparison",
+    "submit_clinical_section": "clinical",
+    "submit_animal_section": "animal_testing",  # single object
+    "submit_emc_section": "emc_safety",  # single object
+    "submit_wireless_section": "wireless",  # single object
+    "submit_software_section": "software",
+    "submit_interop_section": "interoperability",
+    "submit_biocomp_section": "biocompatibility",
+    "submit_sterility_section": "sterility",
+    "submit_shelf_life_section": "shelf_life",
+    "submit_cyber_section": "cybersecurity",
+}
+
+# (tool name, schema, PerformanceTesting attribute, prompt) per section,
+# derived from _MAPPING so the tools and their schemas are listed once
+_SECTIONS: list[tuple[str, type, str, str]] = [
+    (tool, cls, _SECTION_ATTRS[tool], PROMPTS[tool]) for tool, cls in _MAPPING.items()
+]
+
+
+async def _run_all_sections(client, mapping, pid, atts, files=None):
+    # index the documents once for every section
+    vector_store_id = await _vector_store_id(client, atts, files) if atts else None
+
+    async def extract(vector_store_id, sections):
+        return await async_gather_with_max_concurrent(
+            [
+                _generic_extract(
+                    client,
+                    pid,
+                    atts,
+                    vector_store_id,
+                    files,
+                    tool,
+                    cls,
+                    attr,
+                    prompt,
+                )
+                for tool, cls, attr, prompt in sections
+            ],
+            max_concurrent=SECTION_MAX_CONCURRENT,
+            task_name="PERFORMANCE_TESTING_SECTIONS",
+        )
 
-    await doc.save()
+    wanted = [section for section in _SECTIONS if section[0] in mapping]
+    results = await extract(vector_store_id, wanted)
+    # a cached store can vanish mid-run; rebuild it once for the lost sections
+    lost = [
+        section
+        for section, result in zip(wanted, results)
+        if isinstance(result, NotFoundError)
+    ]
+    if lost:
+        logger.warning("Vector store {} not found, rebuilding it", vector_store_id)
+        await _forget_vector_store(_vector_store_cache_key(files))
+        vector_store_id = await _vector_store_id(client, atts, files)
+        results = [
+            *[result for result in results if not isinstance(result, NotFoundError)],
+            *await extract(vector_store_id, lost),
+        ]
+    sections = [result for result in results if isinstance(result, tuple)]
+    if not sections:
+        return
 
-    # ────────── Push the extracted data back into the test‑plan ──────────
+    # one write for the sections, one for the test‑plan
+    await _save_sections(pid, sections)
     try:
-        plan = await PerformanceTestPlan.find_one({"product_id": product_id})
+        plan = await PerformanceTestPlan.find_one({"product_id": pid})
         if plan:
-            for card in plan.tests:
-                same_section = card.section_key == attr_name
-                same_code = getattr(obj, "study_type", None) == card.test_code
-                if same_section and (card.test_code is None or same_code):
-                    # ▸ rationale / confidence
-                    card.ai_rationale = getattr(obj, "discussion", None) or getattr(
-                        obj, "conclusion", None
-                    )
-                    if getattr(obj, "confidence", None) is not None:
-                        perc = int(obj.confidence * 100)
-                        card.ai_confident = perc
-                        card.confident_level = (
-                            PerformanceTestingConfidentLevel.HIGH
-                            if perc >= 80
-                            else PerformanceTestingConfidentLevel.MEDIUM
-                            if perc >= 50
-                            else PerformanceTestingConfidentLevel.LOW
-                        )
-                    # ▸ references / standards
-                    # refs = getattr(obj, "consensus_standards", [])
-                    # refs = _ensure_list(getattr(obj, "consensus_standards", None))
-                    # card.references           = refs
-                    # card.associated_standards = refs
-                    raw = _ensure_list(getattr(obj, "consensus_standards", None))
-                    # turn each string into the required Pydantic objects
-                    card.references = [
-                        PerformanceTestingReference(title=s) for s in raw
-                    ]
-                    card.associated_standards = [
-                        PerformanceTestingAssociatedStandard(name=s) for s in raw
-                    ]
-
-                    # ▸ status
-                    card.status = TestStatus.SUGGESTED  # Suggested by AI
-                    break
+            for attr_name, obj in sections:
+                _apply_to_plan(plan, attr_name, obj)
             await plan.save()
     except Exception as exc:
         logger.warning("⚠️  Could not enrich PerformanceTestPlan: {}", exc)
 
-    logger.info("✅ Saved {} section for {}", tool_name, product_id)
-
-
-# ───────── thin wrappers for each questionnaire section ──────
-async def _run_all_sections(client, aid, mapping, pid, atts):
-    prompts = {
-        "submit_analytical_section": "Extract analytical-performance data. Populate these fields when present:\n"
-        "• pro  duct_name • product_identifier • protocol_id • objective • "
-        "specimen_description • specimen_collection • samples_replicates_sites • "
-        "positive_controls • negative_controls • calibration_requirements • "
-        "assay_steps • data_analysis_plan • statistical_analysis_plan • "
-        "acceptance_criteria • consensus_standards • deviations • discussion • "
-        "conclusion\n"
-        "Return them via the function tool. Use 'not available' for any field you "
-        "cannot populate.",
-        "submit_comparison_section": "Extract method/matrix comparison study data.",
-        "submit_clinical_section": "Extract clinical-performance study data.",
-        "submit_animal_section": "Extract GLP animal testing data.",
-        "submit_emc_section": "Extract EMC / electrical-safety data.",
-        "submit_wireless_section": "Extract wireless-coexistence data.",
-        "submit_software_section": "Extract software performance data.",
-        "submit_interop_section": "Extract interoperability data.",
-        "submit_biocomp_section": "Extract biocompatibility data.",
-        "submit_sterility_section": "Extract sterility validation data.",
-        "submit_shelf_life_section": "Extract shelf-life / aging data.",
-        "submit_cyber_section": "Extract cyber-security data.",
-    }
-
-    attr_map = {
-        "AnalyticalStudy": "analytical",
-        "ComparisonStudy": "comparison",
-        "ClinicalStudy": "clinical",
-        "AnimalTesting": "animal_testing",  # single object
-        "EMCSafety": "emc_safety",  # single object
-        "WirelessCoexistence": "wireless",  # single object
-        "SoftwarePerformance": "software",
-        "Interoperability": "interoperability",
-        "Biocompatibility": "biocompatibility",
-        "SterilityValidation": "sterility",
-        "ShelfLife": "shelf_life",
-        "CyberSecurity": "cybersecurity",
-    }
-
-    # for tool, cls in mapping.items():
-    #     attr = attr_map[cls.__name__]
-    #     attr = attr if attr != "shelflife" else "shelf_life"
-    #     await _generic_extract(client, aid, pid, atts, tool, cls, attr, prompts[tool])
-
-    await async_gather_with_max_concurrent([
-        _generic_extract(
-            client,
-            aid,
-            pid,
-            atts,
-            tool,
-            cls,
-            attr_map[cls.__name__]
-            if attr_map[cls.__name__] != "shelflife"
-            else "shelf_life",
-            prompts[tool],
-        )
-        for tool, cls in mapping.items()
-    ])
+    logger.info("✅ Saved {} sections for {}", len(sections), pid)
 
 
 # ───── helper used to map tool-names → top-level “section keys” ─────
@@ -441,12 +742,32 @@ def _section_key(tool_name: str) -> str:
 
 
 # ───────── public entry point ───────────────────────────────
+# An analysis runs for minutes. Its lock carries a short TTL that a
+# watchdog keeps renewing, so a crashed worker still frees it quickly.
+ANALYZE_LOCK_TIMEOUT = 300
+ANALYZE_LOCK_REFRESH = 60
+
+
+async def _keep_lock(lock, job: asyncio.Task) -> None:
+    """Renew `lock` while `job` runs; stop the job once the lock is lost."""
+    while True:
+        await asyncio.sleep(ANALYZE_LOCK_REFRESH)
+        try:
+            await lock.extend(ANALYZE_LOCK_TIMEOUT, replace_ttl=True)
+        except Exception as exc:
+            logger.error("Lost lock {}, stopping analysis: {}", lock.name, exc)
+            job.cancel()
+            return
+
+
 async def analyze_performance_testing(
     product_id: str,
     attachment_ids: Optional[List[str]] = None,
     card_ids: Optional[Sequence[str]] = None,  # run selected cards only
 ) -> int:
-    lock = redis_client.lock(f"pt_analyze_lock:{product_id}", timeout=15)
+    lock = redis_client.lock(
+        f"pt_analyze_lock:{product_id}", timeout=ANALYZE_LOCK_TIMEOUT
+    )
     if not await lock.acquire(blocking=False):
         logger.warning("Analysis already running for {}", product_id)
         return
@@ -455,7 +776,10 @@ async def analyze_performance_testing(
     await progress.init(product_id, total_files=1)
 
     num_files = -1
+    # digest of the document bytes, known only for files uploaded here
+    files_digest = None
 
+    watchdog = asyncio.create_task(_keep_lock(lock, asyncio.current_task()))
     try:
         # ▲ 1) read or auto‑create the test‑plan
         plan_doc = await PerformanceTestPlan.find_one({"product_id": product_id})
@@ -489,9 +813,6 @@ async def analyze_performance_testing(
         else:
             active_sections = None  # ← means “run everything” when plan empty"""
 
-        # client = get_openai_client_sync()
-        # aid, full_mapping = await _assistant_id(client)
-
         # pull doc list from MinIO if caller didn’t hand us explicit IDs
 
         # initialise progress BEFORE starting extraction
@@ -507,39 +828,47 @@ async def analyze_performance_testing(
                 await progress.done()
                 return None  # signals None to the caller
 
-            client = get_openai_client_sync()  # need client early
-            uploads = []
+            client = get_openai_client()  # need client early
             num_files = len(docs)  # pass the number of documents
-            for d in docs:
-                try:
-                    fid = await _upload_via_url(client, d.url, d.file_name)
-                    uploads.append(fid)
-                except Exception as exc:
-                    logger.warning("⚠️  upload failed for %s: %s", d.file_name, exc)
+            results = await async_gather_with_max_concurrent(
+                [_upload_via_url(client, d.url, d.file_name) for d in docs],
+                max_concurrent=UPLOAD_MAX_CONCURRENT,
+                task_name="PERFORMANCE_TESTING_UPLOADS",
+            )
+            uploads = []
+            file_hashes = []
+            for d, result in zip(docs, results):
+                if isinstance(result, Exception):
+                    logger.warning("⚠️  upload failed for {}: {}", d.file_name, result)
+                else:
+                    file_id, file_hash = result
+                    uploads.append(file_id)
+                    file_hashes.append(file_hash)
             attachment_ids = uploads
-            logger.info(" %d PDFs uploaded for %s", len(uploads), product_id)
+            files_digest = _files_digest(file_hashes) if file_hashes else None
+            logger.info(" {} PDFs uploaded for {}", len(uploads), product_id)
         else:
             num_files = len(
                 attachment_ids
             )  # pass the number of documents based on their attachment_ids
-            client = get_openai_client_sync()  # unchanged path
-
-        aid, full_mapping = await _assistant_id(client)
+            client = get_openai_client()  # unchanged path
+            # resolve the dev "local" placeholder once for every section
+            attachment_ids = await _maybe_upload_local_file(client, attachment_ids)
 
         # ▲ 2) filter mapping → only extractor tools we really need
         if active_sections is not None:
             mapping = {
-                k: v
-                for k, v in full_mapping.items()
-                if _section_key(k) in active_sections
+                k: v for k, v in _MAPPING.items() if _section_key(k) in active_sections
             }
         else:
-            mapping = full_mapping  # no plan → run every section
+            mapping = _MAPPING  # no plan → run every section
 
         await PerformanceTesting.find(
             PerformanceTesting.product_id == product_id
         ).delete_many()
-        await _run_all_sections(client, aid, mapping, product_id, attachment_ids)
+        await _run_all_sections(
+            client, mapping, product_id, attachment_ids, files_digest
+        )
 
         # Guard with env so it’s opt-in and won’t surprise anyone with API usage.
         try:
@@ -557,11 +886,20 @@ async def analyze_performance_testing(
             logger.warning("Predicate LLM step skipped due to error: {}", e)
 
         await progress.done()  # mark 100 %
+    except asyncio.CancelledError:
+        if not watchdog.done():
+            raise  # cancelled by the caller, not by a lost lock
+        asyncio.current_task().uncancel()
+        await progress.err()
     except Exception as exc:
         logger.error(f"Performance testing analysis failed for {product_id}: {exc}")
         await progress.err()
     finally:
-        await lock.release()
+        watchdog.cancel()
+        try:
+            await lock.release()
+        except Exception:
+            pass  # already expired or taken over
 
     return num_files
 
@@ -32,7 +32,7 @@ async def analyze_performance_testing_document(
     document_name = object_name.split("/")[-1]
     testing_document_info = analyze_testing_document_info(document_name.split(".")[0])
     file_name = testing_document_info["file_name"]
-    path = await download_minio_file(object_name)
+    path = await download_minio_file(object_name, obj.size, obj.last_modified)
     logger.info(f"Downloaded file to: {path}")
 
     document = PerformanceTestingDocumentResponse(
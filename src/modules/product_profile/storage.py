@@ -31,7 +31,7 @@ async def parse_product_profile_document(
     profile_document_info = parse_profile_document_info(document_name.split(".")[0])
     file_name = profile_document_info["file_name"]
     logger.info(f"Profile document info: {profile_document_info}")
-    path = await download_minio_file(obj.object_name)
+    path = await download_minio_file(obj.object_name, obj.size, obj.last_modified)
     logger.info(f"Downloaded file to: {path}")
 
     document = ProductProfileDocumentResponse(
@@ -1,4 +1,5 @@
 from pathlib import Path
+from beanie.operators import Set
 from loguru import logger
 from src.modules.regulatory_pathway.model import (
     RegulatoryPathway,
@@ -38,10 +39,12 @@ async def do_analyze_regulatory_pathway(product_id: str) -> None:
     )
 
     # Save pathway
-    await RegulatoryPathway.find(
-        RegulatoryPathway.product_id == product_id
-    ).delete_many()
     record = {**result.model_dump(), "product_id": product_id}
-    await RegulatoryPathway(**record).save()
+    await RegulatoryPathway.find_one(
+        RegulatoryPathway.product_id == product_id
+    ).upsert(
+        Set(record),
+        on_insert=RegulatoryPathway(**record),
+    )
 
     logger.info(f"Saved regulatory pathway for {product_id}")
@@ -8,6 +8,7 @@ class RegulatoryPathway(Document, RegulatoryPathwayBase):
 
     class Settings:
         name = "regulatory_pathway"
+        indexes = ["product_id"]
 
     class Config:
         json_encoders = {
@@ -1,30 +1,69 @@
-from src.infrastructure.minio import get_object
+import asyncio
+from datetime import datetime
+from src.infrastructure.minio import download_object
 from pathlib import Path
 from loguru import logger
 
-from src.utils.async_gather_with_max_concurrent import async_gather_with_max_concurrent
 
+def is_local_copy_fresh(
+    path: Path,
+    size: int | None,
+    last_modified: datetime | None,
+) -> bool:
+    """
+    True when `path` already holds the object described by `size` and
+    `last_modified`, i.e. it was downloaded on a previous run and the
+    object has not been replaced since.
+    """
+    if size is None or last_modified is None:
+        return False
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return False
+    return stat.st_size == size and stat.st_mtime >= last_modified.timestamp()
 
-async def download_minio_file(key: str) -> Path:
+
+# Downloads currently running, keyed by destination, so concurrent
+# callers asking for the same file share one fetch.
+_inflight_downloads: dict[Path, asyncio.Task[Path]] = {}
+
+
+async def download_minio_file(
+    key: str,
+    size: int | None = None,
+    last_modified: datetime | None = None,
+    dest_path: Path | None = None,
+) -> Path:
+    """
+    Download `key` to `dest_path`, or to /tmp/<key> when it is not given.
+    """
+    temp_path = dest_path or Path(f"/tmp/{key}")
+    task = _inflight_downloads.get(temp_path)
+    if task is None:
+        task = asyncio.create_task(
+            _download_minio_file(key, temp_path, size, last_modified)
+        )
+        _inflight_downloads[temp_path] = task
+        task.add_done_callback(lambda _: _inflight_downloads.pop(temp_path, None))
+    else:
+        logger.info(f"Waiting for in-flight download of key={key}")
+    # Shield so one cancelled caller does not cancel the fetch for the others
+    return await asyncio.shield(task)
+
+
+async def _download_minio_file(
+    key: str,
+    temp_path: Path,
+    size: int | None,
+    last_modified: datetime | None,
+) -> Path:
+    if is_local_copy_fresh(temp_path, size, last_modified):
+        logger.info(f"Reusing local copy of key={key} at {temp_path}")
+        return temp_path
     logger.info(f"Downloading file from MinIO with key={key}")
-    raw_data = await get_object(key)
-    temp_path = Path(f"/tmp/{key}")
     temp_path.parent.mkdir(parents=True, exist_ok=True)
-    with open(temp_path, "wb") as f:
-        f.write(raw_data)
+    await download_object(key, temp_path, size)
     logger.info(f"Saved file to {temp_path}")
     return temp_path
 
-
-async def download_minio_files(keys: list[str]) -> list[Path]:
-    keys = list(set(keys))
-
-    tasks = [download_minio_file(key) for key in keys]
-    downloaded_paths = await async_gather_with_max_concurrent(
-        tasks,
-    )
-    logger.info(f"All files downloaded. Total files: {len(keys)}")
-    logger.info(
-        f"Downloaded files: {', '.join(str(path) for path in downloaded_paths)}"
-    )
-    return downloaded_paths
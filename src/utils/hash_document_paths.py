@@ -1,5 +1,5 @@
 from pathlib import Path
-from hashlib import sha1
+from hashlib import file_digest, sha1
 
 
 ALPHABET = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ1234567890"
@@ -7,7 +7,16 @@ BASE = len(ALPHABET)
 
 
 def hash_data(data: bytes) -> str:
-    sha_digest = sha1(data).digest()
+    return encode_digest(sha1(data).digest())
+
+
+def hash_file(path: Path) -> str:
+    # Same result as hash_data(path.read_bytes()) without loading the file
+    with open(path, "rb") as f:
+        return encode_digest(file_digest(f, "sha1").digest())
+
+
+def encode_digest(sha_digest: bytes) -> str:
     num = int.from_bytes(sha_digest, byteorder="big")
     encoded = ""
     while num > 0:
@@ -17,12 +26,7 @@ def hash_data(data: bytes) -> str:
 
 
 def hash_document_paths(document_paths: list[Path]) -> str:
-    hashes = []
-    for path in document_paths:
-        with open(path, "rb") as f:
-            content = f.read()
-        hashes.append(hash_data(content))
-    hashes.sort()
+    hashes = sorted(hash_file(path) for path in document_paths)
     combined_hash = "".join(hashes)
     return hash_data(combined_hash.encode("utf-8"))
 